@@ -0,0 +1,106 @@
+"""
+Deforestation change-detection benchmark.
+
+Runs the tiled detector on synthetic before/after rasters of several sizes
+and reports latency and peak NumPy working memory (tracemalloc). Up to
+--reference-max it also runs the original whole-image `detect_deforestation`
+and checks the loss percentage and mask agree. The tiled detector and the
+overlay are run sequentially and on --workers threads, and must give
+identical results. With --memmap the rasters live in np.memmap files, so
+the inputs themselves are not held in RAM.
+
+    cd backend && python -m benchmarks.deforestation_bench --sizes 1000 4000 10000 --memmap --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from utils.forest_processor import (detect_deforestation, detect_deforestation_tiled, overlay_heatmap,
+                                    overview_factor)
+
+
+def synthetic_pair(size, memmap_dir=None, band=1024):
+    """A vegetated scene and the same scene with cleared patches"""
+    shape = (size, size, 3)
+    if memmap_dir:
+        before = np.memmap(os.path.join(memmap_dir, f"before_{size}.raw"), np.uint8, "w+", shape=shape)
+        after = np.memmap(os.path.join(memmap_dir, f"after_{size}.raw"), np.uint8, "w+", shape=shape)
+    else:
+        before = np.empty(shape, np.uint8)
+        after = np.empty(shape, np.uint8)
+    rng = np.random.default_rng(size)
+    for y0 in range(0, size, band):
+        y1 = min(size, y0 + band)
+        block = rng.integers(0, 256, (y1 - y0, size, 3), dtype=np.uint8)
+        before[y0:y1] = block
+        # Clearing: every other vertical stripe turns brown (red > green)
+        cleared = block.copy()
+        stripes = (np.arange(size) // max(1, size // 16)) % 2 == 1
+        cleared[:, stripes, 0] = np.maximum(cleared[:, stripes, 0], cleared[:, stripes, 1])
+        after[y0:y1] = cleared
+    return before, after
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed * 1000, peak / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and memory of tiled deforestation detection.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000])
+    parser.add_argument("--reference-max", type=int, default=4000,
+                        help="Largest size the whole-image reference is run at")
+    parser.add_argument("--memmap", action="store_true", help="Keep the rasters in np.memmap files")
+    parser.add_argument("--workers", type=int, default=4, help="Threads for the parallel run")
+    args = parser.parse_args(argv)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            before, after = synthetic_pair(size, tmp if args.memmap else None)
+            (percent, overview), tiled_ms, tiled_mb = measure(detect_deforestation_tiled, before, after,
+                                                              None, None, 1)
+            (par_percent, par_overview), par_ms, par_mb = measure(detect_deforestation_tiled, before, after,
+                                                                  None, None, args.workers)
+            same = par_percent == percent and np.array_equal(par_overview, overview)
+            failed |= not same
+            line = (f"{size}x{size}: tiled {tiled_ms:8.1f} ms, peak {tiled_mb:7.1f} MiB | "
+                    f"{args.workers} workers {par_ms:8.1f} ms, peak {par_mb:7.1f} MiB "
+                    f"{'identical' if same else 'DIFFERENT'} | "
+                    f"overview {overview.shape[1]}x{overview.shape[0]}, loss {percent}%")
+
+            image = np.asarray(after[:overview.shape[0], :overview.shape[1]])
+            overlay, overlay_ms, _ = measure(overlay_heatmap, image, overview, 0.5, 1)
+            par_overlay, par_overlay_ms, _ = measure(overlay_heatmap, image, overview, 0.5, args.workers)
+            same = np.array_equal(overlay, par_overlay)
+            failed |= not same
+            line += (f"\n    overlay {overlay_ms:7.1f} ms | {args.workers} workers {par_overlay_ms:7.1f} ms "
+                     f"{'identical' if same else 'DIFFERENT'}")
+            if size <= args.reference_max:
+                (ref_percent, ref_mask), ref_ms, ref_mb = measure(detect_deforestation, before, after)
+                factor = overview_factor(size, size)
+                h, w = ref_mask.shape
+                ref_overview = np.pad(ref_mask, ((0, -h % factor), (0, -w % factor))).reshape(
+                    -(-h // factor), factor, -(-w // factor), factor).mean(axis=(1, 3))
+                ok = percent == ref_percent and np.allclose(overview, ref_overview, atol=1e-6)
+                failed |= not ok
+                line += (f" | reference {ref_ms:8.1f} ms, peak {ref_mb:7.1f} MiB, "
+                         f"loss {ref_percent}% {'OK' if ok else 'MISMATCH'}")
+            print(line)
+            del before, after
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Heatmap rendering benchmark.
+
+Compares `utils.landfill_processor.generate_heatmap` against the original
+full-resolution implementation it replaced, on synthetic 800x800 inputs
+for both modes: checks the outputs agree within tolerance, then reports
+per-call latency.
+
+    cd backend && python -m benchmarks.heatmap_bench --repeats 50
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from utils.landfill_processor import compute_chaos_index, generate_heatmap
+
+# Allowed deviation from the reference: mean and 99.9th percentile absolute
+# difference of the fused [0, 1] intensity (single pixels straddling the 0.2
+# cutoff can differ by the whole cutoff), and mean difference of the overlay
+FUSION_MEAN_TOL = 0.01
+FUSION_P999_TOL = 0.05
+OVERLAY_MEAN_TOL = 1.0
+
+
+def reference_heatmap(original_image_np, cam_array, texture_map, mode="sat"):
+    """The original full-resolution generate_heatmap, kept for parity checks"""
+    h, w = original_image_np.shape[:2]
+
+    if mode == "land":
+        kernel = np.ones((45, 45), np.uint8)
+        cam_array = cv2.dilate(cam_array, kernel, iterations=2)
+        cam_array = cv2.GaussianBlur(cam_array, (51, 51), 0)
+
+    cam_resized = cv2.resize(cam_array, (w, h), interpolation=cv2.INTER_LINEAR)
+    c_max = np.max(cam_resized)
+    cam_norm = cam_resized / (c_max + 1e-7) if c_max > 0 else cam_resized
+
+    tex_proc = cv2.GaussianBlur(texture_map, (15, 15), 0)
+    _, tex_thresh = cv2.threshold(tex_proc, np.mean(tex_proc) * 1.5, 255, cv2.THRESH_BINARY)
+    tex_clustered = cv2.morphologyEx(tex_thresh, cv2.MORPH_CLOSE, np.ones((21, 21), np.uint8))
+
+    tex_resized = cv2.resize(tex_clustered.astype(np.float32), (w, h), interpolation=cv2.INTER_LINEAR)
+    t_max = np.max(tex_resized)
+    tex_norm = tex_resized / (t_max + 1e-7) if t_max > 0 else tex_resized
+
+    if mode == "land":
+        fusion = cam_norm * 0.5 + tex_norm * 0.5
+        fusion = cv2.GaussianBlur(fusion, (31, 31), 0)
+    else:
+        fusion = cam_norm * 0.8 + (cam_norm * tex_norm) * 0.2
+
+    fusion = np.nan_to_num(np.clip(fusion, 0, 1))
+    fusion = np.power(fusion, 1.1)
+    fusion[fusion < 0.2] = 0.0
+
+    heatmap_raw = np.uint8(255 * fusion)
+    heatmap_color = cv2.applyColorMap(heatmap_raw, cv2.COLORMAP_JET)
+    heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+
+    mask_3d = np.repeat(fusion[:, :, np.newaxis], 3, axis=2)
+    overlay = (original_image_np.astype(np.float32) * (1 - mask_3d * 0.75) +
+               (heatmap_color.astype(np.float32) * mask_3d * 0.75)).astype(np.uint8)
+
+    return overlay, fusion
+
+
+def synthetic_inputs(mode, size=800, seed=0):
+    """A textured scene plus a CAM shaped like the production signal of `mode`"""
+    rng = np.random.default_rng(seed)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), (0, 0), 3)
+    # A cluttered patch so the texture stage has something to cluster
+    patch = image[size // 4:size // 2, size // 3:2 * size // 3]
+    patch[:] = rng.integers(0, 256, patch.shape)
+    _, mag = compute_chaos_index(image)
+
+    cam = np.zeros((size, size), dtype=np.float32)
+    if mode == "land":
+        # Ground mode: YOLO boxes painted at 1.0
+        for _ in range(4):
+            x, y = rng.integers(0, size - 120, 2)
+            bw, bh = rng.integers(20, 120, 2)
+            cam[y:y + bh, x:x + bw] = 1.0
+    else:
+        # Aerial mode: a smooth activation blob
+        yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+        cam = np.exp(-((xx - size * 0.55) ** 2 + (yy - size * 0.4) ** 2) / (2 * (size * 0.12) ** 2))
+        cam = cam.astype(np.float32) * 3.0
+    return image, cam, mag
+
+
+def time_call(fn, args, repeats):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(*args)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parity and latency of the fused heatmap renderer.")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--size", type=int, default=800)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for mode in ("sat", "land"):
+        image, cam, mag = synthetic_inputs(mode, args.size)
+        ref_overlay, ref_fusion = reference_heatmap(image, cam.copy(), mag.copy(), mode)
+        overlay, fusion = generate_heatmap(image, cam, mag, mode)
+
+        fusion_diff = np.abs(fusion - ref_fusion)
+        overlay_diff = np.abs(overlay.astype(np.int16) - ref_overlay.astype(np.int16))
+        fusion_p999 = np.percentile(fusion_diff, 99.9)
+        ok = (fusion_diff.mean() <= FUSION_MEAN_TOL and fusion_p999 <= FUSION_P999_TOL
+              and overlay_diff.mean() <= OVERLAY_MEAN_TOL)
+        failed |= not ok
+
+        ref_ms = time_call(reference_heatmap, (image, cam, mag, mode), args.repeats)
+        new_ms = time_call(generate_heatmap, (image, cam, mag, mode), args.repeats)
+        print(f"[{mode}] fusion diff mean={fusion_diff.mean():.4f} p99.9={fusion_p999:.4f} max={fusion_diff.max():.4f} | "
+              f"overlay diff mean={overlay_diff.mean():.2f} max={overlay_diff.max()} | "
+              f"{'OK' if ok else 'MISMATCH'}")
+        print(f"[{mode}] reference {ref_ms:.2f} ms | fused {new_ms:.2f} ms | {ref_ms / new_ms:.1f}x")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+CAM_PRED inference backend benchmark.
+
+Prepares the aerial model with every available backend (eager with and
+without channels_last, torch.compile, TorchScript, ONNX Runtime), checks
+each one's CAMs and logits against the eager NCHW baseline, then times one
+normal + flipped pair forward on CPU. The int8 backend is benchmarked by
+calibrate_int8.py, which builds the quantized model.
+
+    cd backend && python -m benchmarks.inference_bench --size 800 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+from importlib import import_module
+
+import torch
+
+from utils.model_backends import BACKENDS, PreparedModel, configure_torch_threads
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The int8 backend needs the quantized model, not the fp32 one loaded here;
+# calibrate_int8.py reports its accuracy and latency against fp32
+FP32_BACKENDS = tuple(backend for backend in BACKENDS if backend != "int8")
+# Largest accepted |difference| relative to the baseline's largest |value|
+TOLERANCE = 1e-3
+
+
+def load_cam_pred(module, checkpoint):
+    model = getattr(import_module(module), "CAM_PRED")(1, pretrained=False)
+    if checkpoint and os.path.exists(checkpoint):
+        model.load_state_dict(torch.load(checkpoint, map_location="cpu"), strict=True)
+    else:
+        print(f"No checkpoint at {checkpoint}; timing randomly initialized weights")
+    return model.eval()
+
+
+def as_tuple(outputs):
+    return tuple(outputs) if isinstance(outputs, (tuple, list)) else (outputs,)
+
+
+def time_call(fn, batch, repeats):
+    with torch.inference_mode():
+        fn(batch)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn(batch)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parity and CPU latency of the CAM_PRED inference backends.")
+    parser.add_argument("--size", type=int, default=800)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads (default: all cores)")
+    parser.add_argument("--checkpoint", default=os.path.join(BASE_DIR, "models", "aerial", "checkpoint.pth"))
+    parser.add_argument("--model", default="models.aerial.resnet50_fpn")
+    parser.add_argument("--backends", nargs="+", choices=FP32_BACKENDS, default=list(FP32_BACKENDS))
+    args = parser.parse_args(argv)
+
+    print(f"Torch intra-op threads: {configure_torch_threads(1, args.threads)}")
+    torch.manual_seed(0)
+    image = torch.randn(1, 3, args.size, args.size)
+    batch = torch.cat([image, image.flip(-1)])
+
+    baseline = PreparedModel(load_cam_pred(args.model, args.checkpoint), "cpu", "eager", channels_last=False)
+    with torch.inference_mode():
+        expected = as_tuple(baseline(batch))
+    baseline_ms = time_call(baseline, batch, args.repeats)
+    print(f"eager (NCHW): {baseline_ms:.1f} ms")
+
+    failed = False
+    for backend in args.backends:
+        prepared = PreparedModel(load_cam_pred(args.model, args.checkpoint), "cpu", backend,
+                                 channels_last=True)
+        if prepared.backend != backend:
+            print(f"{backend}: unavailable, skipped")
+            continue
+        with torch.inference_mode():
+            outputs = as_tuple(prepared(batch))
+        error = max(float((o - e).abs().max() / (e.abs().max() + 1e-12)) for o, e in zip(outputs, expected))
+        ok = len(outputs) == len(expected) and error <= TOLERANCE
+        failed |= not ok
+        ms = time_call(prepared, batch, args.repeats)
+        print(f"{backend} (channels_last): {ms:.1f} ms | {baseline_ms / ms:.2f}x | "
+              f"max rel error {error:.2e} {'OK' if ok else 'MISMATCH'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
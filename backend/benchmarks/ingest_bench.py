@@ -0,0 +1,77 @@
+"""
+Upload decode benchmark.
+
+Times the old full decode + resize against `utils.ingest.load_rgb_array`
+(reduced-DCT JPEG decoding) for a phone-sized JPEG, and reports the size
+of the frame each one decodes (Pillow's buffers are invisible to
+tracemalloc, and the decoded frame dominates peak memory). The two
+800x800 results must agree within PIXEL_DIFF_TOL (exit code 1 otherwise).
+
+    cd backend && python -m benchmarks.ingest_bench --width 4032 --height 3024
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.ingest import decode_image, load_rgb_array
+
+TARGET = (800, 800)
+# Mean absolute pixel difference allowed between the full and draft decodes
+# (reduced-DCT scaling filters differently from a full decode + bilinear)
+PIXEL_DIFF_TOL = 2.0
+
+
+def full_decode(data):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    return np.array(image.resize(TARGET, Image.BILINEAR))
+
+
+def synthetic_jpeg(width, height, quality=90):
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def measure(fn, data, repeats):
+    out = fn(data)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(data)
+    return (time.perf_counter() - start) / repeats * 1000, out
+
+
+def frame_mib(size):
+    return size[0] * size[1] * 3 / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full vs draft-mode decoding of an upload to 800x800.")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    data = synthetic_jpeg(args.width, args.height)
+    print(f"{args.width}x{args.height} JPEG, {len(data) / 2 ** 20:.1f} MiB")
+    full_ms, full = measure(full_decode, data, args.repeats)
+    draft_ms, draft = measure(lambda d: load_rgb_array(d, TARGET), data, args.repeats)
+    draft_size = decode_image(data, min_size=TARGET).size
+    diff = np.abs(full.astype(np.int16) - draft.astype(np.int16)).mean()
+    ok = full.shape == draft.shape and diff <= PIXEL_DIFF_TOL
+    print(f"full decode  {full_ms:7.1f} ms | frame {args.width}x{args.height} "
+          f"({frame_mib((args.width, args.height)):.1f} MiB)")
+    print(f"draft decode {draft_ms:7.1f} ms | frame {draft_size[0]}x{draft_size[1]} "
+          f"({frame_mib(draft_size):.1f} MiB) | {full_ms / draft_ms:.1f}x, mean pixel diff {diff:.2f} "
+          f"{'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Texture stage benchmark.
+
+Runs `compute_chaos_index` plus `generate_heatmap` at every pyramid level
+up to --max-level and reports latency and drift against level 0: the
+change in the chaos index (which feeds the calibrated score) and in the
+fused heatmap intensity. Level 0 must match the original full-resolution
+chaos index, and levels up to CHECKED_LEVEL must stay within the drift
+tolerances (exit code 1 otherwise); deeper levels are only reported.
+
+    cd backend && python -m benchmarks.texture_bench --max-level 2 --image site.jpg
+
+Synthetic noise saturates the chaos index at 1.0, so pass a real capture
+with --image to see its drift.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.heatmap_bench import synthetic_inputs
+from utils.landfill_processor import compute_chaos_index, generate_heatmap
+
+# Level 0 against the original chaos index (float32 vs float64 statistics)
+CHAOS_PARITY_TOL = 1e-4
+# Drift from level 0 allowed up to CHECKED_LEVEL, the level README suggests
+CHECKED_LEVEL = 1
+CHAOS_DRIFT_TOL = 0.02
+FUSION_DRIFT_TOL = 0.01
+
+
+def reference_chaos_index(image):
+    """The original full-resolution chaos index, kept for parity checks"""
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    mag = np.abs(cv2.Laplacian(gray, cv2.CV_32F, ksize=3))
+    raw_chaos = float(np.std(mag) / (np.mean(mag) + 1.5))
+    return min(1.0, raw_chaos * 2.2)
+
+
+def run_level(image, cam, mode, level):
+    chaos_idx, mag = compute_chaos_index(image, level=level)
+    _, fusion = generate_heatmap(image, cam, mag, mode)
+    return chaos_idx, fusion.copy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and drift of the texture stage per pyramid level.")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--size", type=int, default=800)
+    parser.add_argument("--max-level", type=int, default=2)
+    parser.add_argument("--image", help="Score this image instead of a synthetic scene")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for mode in ("sat", "land"):
+        image, cam, _ = synthetic_inputs(mode, args.size)
+        if args.image:
+            image = np.array(Image.open(args.image).convert("RGB").resize((args.size, args.size), Image.BILINEAR))
+        base_chaos, base_fusion = run_level(image, cam, mode, 0)
+        ref_chaos = reference_chaos_index(image)
+        ok = abs(base_chaos - ref_chaos) <= CHAOS_PARITY_TOL
+        failed |= not ok
+        print(f"[{mode}] level 0 chaos {base_chaos:.4f} vs reference {ref_chaos:.4f} | "
+              f"{'OK' if ok else 'MISMATCH'}")
+        for level in range(args.max_level + 1):
+            chaos_idx, fusion = run_level(image, cam, mode, level)
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                run_level(image, cam, mode, level)
+            ms = (time.perf_counter() - start) / args.repeats * 1000
+            chaos_delta = chaos_idx - base_chaos
+            fusion_diff = np.abs(fusion - base_fusion).mean()
+            if level <= CHECKED_LEVEL:
+                ok = abs(chaos_delta) <= CHAOS_DRIFT_TOL and fusion_diff <= FUSION_DRIFT_TOL
+                failed |= not ok
+                verdict = "OK" if ok else "DRIFT"
+            else:
+                verdict = "not checked"
+            print(f"[{mode}] level {level}: {ms:.2f} ms | chaos {chaos_idx:.4f} "
+                  f"(delta {chaos_delta:+.4f}) | fusion diff mean={fusion_diff:.4f} | {verdict}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
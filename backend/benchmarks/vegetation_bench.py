@@ -0,0 +1,88 @@
+"""
+Vegetation mask micro-benchmark.
+
+Checks `vegetation_mask_rgb` and `detect_deforestation` against the
+original float64 implementation, exhaustively over every (red, green)
+pair for several thresholds and on random images, then times both.
+
+    cd backend && python -m benchmarks.vegetation_bench --size 2000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from utils.forest_processor import detect_deforestation, vegetation_mask_rgb
+
+THRESHOLDS = (0.1, 0.0, 0.05, 0.3, -0.2, 0.99)
+
+
+def reference_mask(image_np, threshold=0.1):
+    """The original float64 vegetation_mask_rgb"""
+    r = image_np[:, :, 0].astype(float)
+    g = image_np[:, :, 1].astype(float)
+    vegetation_index = (g - r) / (g + r + 1e-5)
+    return vegetation_index > threshold
+
+
+def reference_detect(img1_np, img2_np):
+    """The original detect_deforestation"""
+    mask1 = reference_mask(img1_np)
+    mask2 = reference_mask(img2_np)
+    vegetation_loss = mask1 & (~mask2)
+    total_veg = mask1.sum()
+    lost_veg = vegetation_loss.sum()
+    percent = (lost_veg / total_veg) * 100 if total_veg > 0 else 0
+    return round(percent, 2), vegetation_loss
+
+
+def every_red_green_pair():
+    r, g = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+    b = np.random.default_rng(0).integers(0, 256, r.shape, dtype=np.uint8)
+    return np.dstack([r, g, b])
+
+
+def time_call(fn, args, repeats):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(*args)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parity and speed of the vegetation mask fast path.")
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    failed = False
+    pairs = every_red_green_pair()
+    for threshold in THRESHOLDS:
+        ok = np.array_equal(vegetation_mask_rgb(pairs, threshold), reference_mask(pairs, threshold))
+        failed |= not ok
+        print(f"threshold {threshold:+.2f}: all 65536 (r, g) pairs {'OK' if ok else 'MISMATCH'}")
+
+    rng = np.random.default_rng(1)
+    before = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    after = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    percent, mask = detect_deforestation(before, after)
+    ref_percent, ref_mask = reference_detect(before, after)
+    ok = percent == ref_percent and np.array_equal(mask, ref_mask)
+    failed |= not ok
+    print(f"detect_deforestation {args.size}x{args.size}: {percent}% {'OK' if ok else 'MISMATCH'}")
+
+    for name, fast, ref, fn_args in (
+        ("vegetation_mask_rgb", vegetation_mask_rgb, reference_mask, (before,)),
+        ("detect_deforestation", detect_deforestation, reference_detect, (before, after)),
+    ):
+        ref_ms = time_call(ref, fn_args, args.repeats)
+        fast_ms = time_call(fast, fn_args, args.repeats)
+        print(f"{name}: float64 {ref_ms:.1f} ms | fast path {fast_ms:.1f} ms | {ref_ms / fast_ms:.1f}x")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Int8 calibration of the aerial model.
+
+Quantizes the CAM_PRED model (post-training static int8) with activation
+ranges observed on sample tiles, saves it next to the fp32 checkpoint for
+INFERENCE_BACKEND=int8, and reports how far its classification scores and
+CAMs drift from fp32 on held-out tiles, together with the CPU latency of
+both.
+
+    python calibrate_int8.py samples.zip district.tif --calibration-tiles 64 --eval-tiles 32 --report int8.json
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from importlib import import_module
+
+import numpy as np
+import torch
+
+from utils.image_processor import ImageProcessor
+from utils.imutils import pre_process_image, process_image_for_cams
+from utils.model_backends import (QUANTIZED_ENGINE, configure_torch_threads, default_int8_path,
+                                  quantize_int8, save_int8)
+from utils.tile_scanner import MODEL_INPUT_SIZE, iter_tiles
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# CAM cells above this value count as activated when comparing the masks
+CAM_THRESHOLD = 0.5
+
+
+def collect_tiles(sources, tile_size, count):
+    tiles = itertools.chain.from_iterable(iter_tiles(source, tile_size) for source in sources)
+    return [tile_np for _, tile_np in itertools.islice(tiles, count)]
+
+
+def as_cam_batch(tile_np):
+    """The (2, C, H, W) normal + flipped tensor ImageProcessor feeds CAM_PRED"""
+    return torch.from_numpy(np.ascontiguousarray(process_image_for_cams(pre_process_image(tile_np))))
+
+
+def run_engine(engine, tiles):
+    engine.warmup((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+    scores, cams, latencies = [], [], []
+    for tile_np in tiles:
+        start = time.perf_counter()
+        wrapper = engine.execute_cams_pred(tile_np)
+        latencies.append((time.perf_counter() - start) * 1000)
+        scores.append(float(wrapper.classification_scores[0]))
+        cams.append(wrapper.global_cams[0])
+    return np.array(scores), np.stack(cams), np.array(latencies)
+
+
+def compare(fp32, int8):
+    fp32_scores, fp32_cams, fp32_ms = fp32
+    int8_scores, int8_cams, int8_ms = int8
+    score_error = np.abs(int8_scores - fp32_scores)
+    cam_error = np.abs(int8_cams - fp32_cams)
+    fp32_mask = fp32_cams > CAM_THRESHOLD
+    int8_mask = int8_cams > CAM_THRESHOLD
+    union = np.count_nonzero(fp32_mask | int8_mask)
+    return {
+        "tiles": len(fp32_scores),
+        "score_mean_abs_error": round(float(score_error.mean()), 5),
+        "score_max_abs_error": round(float(score_error.max()), 5),
+        "cam_mean_abs_error": round(float(cam_error.mean()), 5),
+        "cam_p99_abs_error": round(float(np.percentile(cam_error, 99)), 5),
+        "cam_mask_iou": round(np.count_nonzero(fp32_mask & int8_mask) / union, 4) if union else 1.0,
+        "fp32_median_ms": round(float(np.median(fp32_ms)), 1),
+        "int8_median_ms": round(float(np.median(int8_ms)), 1),
+        "speedup": round(float(np.median(fp32_ms) / np.median(int8_ms)), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize the aerial model to int8 and report its drift from fp32.")
+    parser.add_argument("sources", nargs="+", help="Mosaics or zip archives of sample tiles")
+    parser.add_argument("--tile-size", type=int, default=MODEL_INPUT_SIZE, help="Mosaic tile edge in pixels")
+    parser.add_argument("--calibration-tiles", type=int, default=64)
+    parser.add_argument("--eval-tiles", type=int, default=32, help="Held-out tiles for the report")
+    parser.add_argument("--checkpoint", default=os.path.join(BASE_DIR, "models", "aerial", "checkpoint.pth"))
+    parser.add_argument("--model", default="models.aerial.resnet50_fpn")
+    parser.add_argument("--output", default=None, help="Quantized model path (default: <checkpoint>.int8.pt)")
+    parser.add_argument("--engine", default=QUANTIZED_ENGINE, help="Quantized kernels: x86, fbgemm or qnnpack")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads (default: all cores)")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON here")
+    args = parser.parse_args(argv)
+    output = args.output or default_int8_path(args.checkpoint)
+    configure_torch_threads(1, args.threads)
+
+    tiles = collect_tiles(args.sources, args.tile_size, args.calibration_tiles + args.eval_tiles)
+    if not tiles:
+        print("No tiles found in the given sources", file=sys.stderr)
+        return 1
+    calibration, held_out = tiles[:args.calibration_tiles], tiles[args.calibration_tiles:]
+    if not held_out:
+        print("No held-out tiles left; the report reuses the calibration tiles", file=sys.stderr)
+        held_out = calibration
+
+    model = getattr(import_module(args.model), ImageProcessor.CAM_PRED_MODEL_CLASS_NAME)(1, pretrained=False)
+    model.load_state_dict(torch.load(args.checkpoint, map_location="cpu"), strict=True)
+    print(f"Calibrating on {len(calibration)} tiles ({args.engine})", file=sys.stderr)
+    quantized = quantize_int8(model, (as_cam_batch(tile_np) for tile_np in calibration), args.engine)
+    save_int8(quantized, as_cam_batch(calibration[0]), output)
+    print(f"Saved {output} ({os.path.getsize(output) / 2**20:.1f} MB, "
+          f"fp32 checkpoint {os.path.getsize(args.checkpoint) / 2**20:.1f} MB)", file=sys.stderr)
+
+    engines = {}
+    for backend in ("eager", "int8"):
+        engines[backend] = ImageProcessor(["suspicious_site"], args.checkpoint, model=args.model,
+                                          scales=(1.0,), backend=backend, int8_path=output)
+        engines[backend].device = torch.device("cpu")
+    report = compare(run_engine(engines["eager"], held_out), run_engine(engines["int8"], held_out))
+    report["model_path"] = output
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,39 @@
 
 import os
-import io
-import base64
+import asyncio
 import torch
 import numpy as np
 import cv2
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
 from utils.image_processor import ImageProcessor
-from utils.forest_processor import detect_deforestation, overlay_heatmap
+from utils.model_backends import configure_torch_threads
+from utils.forest_processor import classify_deforestation_loss, detect_deforestation_tiled, overlay_heatmap
+from utils.deforestation_series import VegetationMaskCache, analyze_series
+from utils.landfill_processor import (SAT_MIDPOINT, GROUND_MIDPOINT, compute_chaos_index,
+                                      fuse_sat_score, fuse_ground_score, calibrate_score,
+                                      classify_landfill_score, generate_heatmap)
+from utils.inference_pool import InferencePool, InferenceQueueFull
+from utils.micro_batcher import MicroBatcher
+from utils.tile_scanner import TileScanner, iter_tiles
+from utils.result_cache import ResultCache
+from utils.report_store import ReportStore
+from utils.change_feed import ChangeNotifier
+from utils.report_media import ReportMediaBusy, ReportMediaWriter
+from utils.artifact_store import ArtifactStore, ImmutableStaticFiles, parse_heatmap_options
+from utils.ingest import (MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, ImageTooLarge, UnsupportedImage,
+                          UploadTooLarge, UploadLimitMiddleware, decode_image, load_rgb_array,
+                          probe_image, read_upload)
+from starlette.concurrency import run_in_threadpool
 from ultralytics import YOLO
-import sqlite3
-from datetime import datetime
-from typing import Optional
+import json
+import tempfile
+import time
+import zipfile
+from typing import List, Optional
 
 # Robust Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,41 +41,12 @@ DB_PATH = os.path.join(BASE_DIR, "reports.db")
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads", "reports")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Check if category column exists, add it if not
-    cursor.execute("PRAGMA table_info(reports)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    if 'category' not in columns:
-        cursor.execute('''CREATE TABLE IF NOT EXISTS reports_new 
-                         (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                          lat REAL, lng REAL, score REAL, 
-                          category TEXT, status TEXT, image_path TEXT, timestamp DATETIME)''')
-        # If old table exists, migrate data
-        if 'lat' in columns:
-            cursor.execute("INSERT INTO reports_new (lat, lng, score, status, timestamp) SELECT lat, lng, score, status, timestamp FROM reports")
-            cursor.execute("DROP TABLE reports")
-        cursor.execute("ALTER TABLE reports_new RENAME TO reports")
-        # Set default values for old data
-        cursor.execute("UPDATE reports SET category = 'landfill' WHERE category IS NULL")
-    
-    # Check for image_path specifically if category already existed
-    if 'image_path' not in columns:
-        try:
-            cursor.execute("ALTER TABLE reports ADD COLUMN image_path TEXT")
-        except sqlite3.OperationalError:
-            pass # Column already exists
-            
-    cursor.execute('''CREATE TABLE IF NOT EXISTS reports 
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                      lat REAL, lng REAL, score REAL, 
-                      category TEXT, status TEXT, image_path TEXT, timestamp DATETIME)''')
-    conn.commit()
-    conn.close()
-
-init_db()
+report_store = ReportStore(DB_PATH)
+report_store.init_schema()
+# Report images (original bytes + dashboard thumbnail) are written off the request path
+report_media = ReportMediaWriter(UPLOAD_DIR, "/uploads/reports")
+# Wakes up /api/reports/stream subscribers after report inserts and deletes
+report_changes = ChangeNotifier()
 
 def find_nearest_officials(lat, lng):
     return {
@@ -68,6 +57,25 @@ def find_nearest_officials(lat, lng):
 
 app = FastAPI(title="EcoGuard Pro | Dual-Perspective Surveillance")
 
+# Oversized analyze requests are refused before their multipart body is
+# spooled (added before CORS so the 413 still carries CORS headers)
+_MULTIPART_OVERHEAD = 64 * 1024
+DEFOREST_SERIES_MAX_EPOCHS = int(os.getenv("DEFOREST_SERIES_MAX_EPOCHS", 64))
+# Per-image limit of the before/after pair: the tiled detector is meant for
+# rasters (up to INGEST_MAX_PIXELS) far beyond MAX_UPLOAD_BYTES
+DEFOREST_MAX_UPLOAD_BYTES = int(os.getenv("DEFOREST_MAX_UPLOAD_BYTES", 268435456))  # 256MB
+# A bulk scan upload (mosaic or zip of tiles) is allowed to be much larger
+SCAN_MAX_UPLOAD_BYTES = int(os.getenv("SCAN_MAX_UPLOAD_BYTES", 268435456))  # 256MB
+# A bulk scan that finds the inference pool full retries its batch after this
+SCAN_RETRY_SECONDS = float(os.getenv("SCAN_RETRY_SECONDS", 0.25))
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/predict": MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD,
+    "/api/analyze/landfill": MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD,
+    "/api/analyze/deforestation": 2 * DEFOREST_MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD,
+    "/api/analyze/deforestation/series": DEFOREST_SERIES_MAX_EPOCHS * (MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD),
+    "/api/scan/tiles": SCAN_MAX_UPLOAD_BYTES + _MULTIPART_OVERHEAD,
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -75,6 +83,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Heatmaps are content-addressed, so their URLs can be cached forever.
+# Mounted before /uploads so this mount wins for its prefix.
+HEATMAP_DIR = os.path.join(BASE_DIR, "uploads", "heatmaps")
+heatmap_store = ArtifactStore(HEATMAP_DIR, "/uploads/heatmaps")
+app.mount("/uploads/heatmaps", ImmutableStaticFiles(directory=HEATMAP_DIR), name="heatmaps")
+
 # Serve local uploads for the dashboard
 app.mount("/uploads", StaticFiles(directory=os.path.join(BASE_DIR, "uploads")), name="uploads")
 
@@ -88,52 +102,140 @@ GROUND_MODEL_PATH = os.path.join(BASE_DIR, "models", "ground", "taco_yolov8.pt")
 device = "cuda" if torch.cuda.is_available() else "cpu"
 print(f"Systems Online. Primary device: {device}")
 
+# Startup phases and their durations, reported by /api/ready
+readiness = {"ready": False, "error": None, "phases": {}}
+
 aerial_engine = ImageProcessor(AERIAL_CATS, AERIAL_STATE_DICT, model=AERIAL_MODEL_PATH, scales=(1.0,))
+# Default test-time augmentation set of satellite analyses ("fast" or "accurate"),
+# overridable per request with ?tta=
+AERIAL_TTA = os.getenv("AERIAL_TTA", "fast")
+_phase_start = time.perf_counter()
 ground_engine = YOLO(GROUND_MODEL_PATH)
+readiness["phases"]["ground_load"] = round(time.perf_counter() - _phase_start, 3)
+
+# Model forwards run here so the event loop stays free for other requests
+inference_pool = InferencePool()
+# Each concurrent forward gets its share of the cores instead of all of them
+print(f"Torch intra-op threads: {configure_torch_threads(inference_pool.max_workers)}")
+# Repeat uploads of the same bytes skip decode, inference and heatmap encoding
+result_cache = ResultCache()
+# Per-image vegetation masks shared by every time series that includes the image
+vegetation_masks = VegetationMaskCache()
 
-def generate_heatmap(original_image_np, cam_array, texture_map, mode="sat"):
+def get_cached_result(cache_key):
+    """A cached analysis result, unless its heatmap artifact has since been
+    swept from the heatmap store (then it is recomputed and re-published)."""
+    cached = result_cache.get(cache_key)
+    if cached is not None and not heatmap_store.refresh(cached["heatmap"]):
+        return None
+    return cached
+
+def warm_up_engines():
     """
-    Surgical Neural Fusion with Texture-Aware Clustering.
+    Loads every engine and runs one dummy forward at the production
+    resolution (800x800) so no user request lands on a cold model.
     """
-    h, w = original_image_np.shape[:2]
-    
-    if mode == "land":
-        kernel = np.ones((45, 45), np.uint8)
-        cam_array = cv2.dilate(cam_array, kernel, iterations=2)
-        cam_array = cv2.GaussianBlur(cam_array, (51, 51), 0)
-    
-    cam_resized = cv2.resize(cam_array, (w, h), interpolation=cv2.INTER_LINEAR)
-    c_max = np.max(cam_resized)
-    cam_norm = cam_resized / (c_max + 1e-7) if c_max > 0 else cam_resized
-    
-    tex_proc = cv2.GaussianBlur(texture_map, (15, 15), 0)
-    _, tex_thresh = cv2.threshold(tex_proc, np.mean(tex_proc) * 1.5, 255, cv2.THRESH_BINARY)
-    tex_clustered = cv2.morphologyEx(tex_thresh, cv2.MORPH_CLOSE, np.ones((21, 21), np.uint8))
-    
-    tex_resized = cv2.resize(tex_clustered.astype(np.float32), (w, h), interpolation=cv2.INTER_LINEAR)
-    t_max = np.max(tex_resized)
-    tex_norm = tex_resized / (t_max + 1e-7) if t_max > 0 else tex_resized
+    phases = readiness["phases"]
+    if aerial_engine:
+        timings = aerial_engine.warmup((800, 800))
+        phases["aerial_load"] = round(timings["load"], 3)
+        phases["aerial_warmup"] = round(timings["warmup"], 3)
+    if ground_engine:
+        start = time.perf_counter()
+        ground_engine(np.zeros((800, 800, 3), dtype=np.uint8), verbose=False, conf=0.05)
+        phases["ground_warmup"] = round(time.perf_counter() - start, 3)
+
+# Image edge of the small predict that builds YOLO's predictor before fork
+GROUND_PRELOAD_SIZE = 64
+
+def preload_engines():
+    """
+    Loads the model weights and prepares YOLO for inference before
+    serve.py forks its workers, so they share the weight pages instead of
+    each writing a copy. Torch is held to one thread meanwhile so the work
+    stays inline: intra-op thread pools started before a fork do not
+    survive it. The aerial model runs no forward here; its warm-up runs in
+    every worker. Returns the seconds spent per engine.
+    """
+    timings = {}
+    num_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        if aerial_engine:
+            start = time.perf_counter()
+            aerial_engine.load()
+            timings["aerial_load"] = round(time.perf_counter() - start, 3)
+        if ground_engine:
+            start = time.perf_counter()
+            # fuse_conv_and_bn allocates new conv weights, and the first
+            # predict builds a predictor holding its own fused copy of the
+            # model; done in each worker, each would write a private YOLOv8
+            ground_engine.fuse()
+            ground_engine(np.zeros((GROUND_PRELOAD_SIZE, GROUND_PRELOAD_SIZE, 3), dtype=np.uint8),
+                          verbose=False, conf=0.05)
+            timings["ground_prepare"] = round(time.perf_counter() - start, 3)
+    finally:
+        torch.set_num_threads(num_threads)
+    return timings
+
+def load_landfill_image(contents):
+    """Decodes an upload once into its 800x800 RGB array (JPEGs are
+    draft-decoded near that size)."""
+    return load_rgb_array(contents, (800, 800))
+
+def detect_ground_batch(images_np):
+    """Runs YOLOv8 once over a batch of 800x800 images.
+
+    Returns one ``(max_confidence, normalized_xyxy_boxes)`` pair per image.
+    """
+    detections = []
+    for results in ground_engine(images_np, verbose=False, conf=0.05):
+        if len(results.boxes) > 0:
+            yolo_score = float(torch.max(results.boxes.conf).cpu().item())
+            detections.append((yolo_score, results.boxes.xyxyn.cpu().numpy()))
+        else:
+            detections.append((0, np.zeros((0, 4), dtype=np.float32)))
+    return detections
+
+def run_landfill_analysis(image_np, mode, detections=None, heatmap_options=None, tta=None):
+    """Scores an 800x800 image with the aerial engine or with precomputed
+    ground detections and renders its heatmap.
+
+    Runs on an inference worker thread, never on the event loop.
+    """
+    chaos_idx, mag = compute_chaos_index(image_np)
     
-    if mode == "land":
-        fusion = cam_norm * 0.5 + tex_norm * 0.5
-        fusion = cv2.GaussianBlur(fusion, (31, 31), 0)
+    score = 0
+    cam_signal = np.zeros((800, 800), dtype=np.float32)
+    yolo_score = 0
+
+    if mode == "sat":
+        if aerial_engine:
+            iw = aerial_engine.execute_cams_pred(image_np, tta)
+            resnet_score = float(iw.classification_scores[0])
+            cam_signal = iw.global_cams[0].astype(np.float32)
+            score = fuse_sat_score(resnet_score, chaos_idx)
+        else:
+            score = chaos_idx
+        x0 = SAT_MIDPOINT
     else:
-        fusion = cam_norm * 0.8 + (cam_norm * tex_norm) * 0.2
+        if detections is not None:
+            yolo_score, boxes = detections
+            for x1, y1, x2, y2 in boxes:
+                cam_signal[int(y1*800):int(y2*800), int(x1*800):int(x2*800)] = 1.0
         
-    fusion = np.nan_to_num(np.clip(fusion, 0, 1))
-    fusion = np.power(fusion, 1.1)
-    fusion[fusion < 0.2] = 0.0
+        score = fuse_ground_score(yolo_score, chaos_idx)
+        x0 = GROUND_MIDPOINT
     
-    heatmap_raw = np.uint8(255 * fusion)
-    heatmap_color = cv2.applyColorMap(heatmap_raw, cv2.COLORMAP_JET)
-    heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+    final_score = calibrate_score(score, x0)
     
-    mask_3d = np.repeat(fusion[:, :, np.newaxis], 3, axis=2)
-    overlay = (original_image_np.astype(np.float32) * (1 - mask_3d * 0.75) + 
-               (heatmap_color.astype(np.float32) * mask_3d * 0.75)).astype(np.uint8)
+    print(f"[Neural Trace] Mode: {mode} | YOLO: {yolo_score:.3f} | Chaos: {chaos_idx:.3f} | Raw: {score:.3f} | Final: {final_score:.4f}")
     
-    _, buffer = cv2.imencode('.png', cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR))
-    return base64.b64encode(buffer).decode('utf-8')
+    overlay, fusion = generate_heatmap(image_np, cam_signal, mag, mode=mode)
+    return final_score, heatmap_store.publish(overlay, fusion, heatmap_options)
+
+ground_batcher = MicroBatcher(detect_ground_batch, inference_pool)
+tile_scanner = TileScanner(aerial_engine)
 
 @app.post("/predict")
 @app.post("/api/analyze/landfill")
@@ -141,93 +243,61 @@ async def predict(
     file: UploadFile = File(...), 
     mode: str = "sat", 
     lat: str = Form("null"), 
-    lng: str = Form("null")
+    lng: str = Form("null"),
+    heatmap_delivery: Optional[str] = None,
+    heatmap_format: Optional[str] = None,
+    heatmap_quality: Optional[int] = None,
+    tta: Optional[str] = None
 ):
     if torch.cuda.is_available(): torch.cuda.empty_cache()
     
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
-        image_np = np.array(image.resize((800, 800), Image.BILINEAR))
-        
-        gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-        laplacian = cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
-        mag = np.abs(laplacian)
-        
-        raw_chaos = float(np.std(mag) / (np.mean(mag) + 1.5))
-        chaos_idx = min(1.0, raw_chaos * 2.2) 
-        
-        score = 0
-        cam_signal = np.zeros((800, 800), dtype=np.float32)
-        yolo_score = 0
-
-        if mode == "sat":
-            if aerial_engine:
-                iw = aerial_engine.execute_cams_pred(image_np)
-                resnet_score = float(iw.classification_scores[0])
-                cam_signal = iw.global_cams[0].astype(np.float32)
-                score = (resnet_score * 0.6) + (chaos_idx * 0.4)
-            else:
-                score = chaos_idx
-            x0 = 0.60 
+        heatmap_options = parse_heatmap_options(heatmap_delivery, heatmap_format, heatmap_quality)
+        tta = tta or AERIAL_TTA
+        if tta not in ImageProcessor.TTA_PRESETS:
+            raise ValueError(f"tta must be one of: {', '.join(ImageProcessor.TTA_PRESETS)}")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    try:
+        contents = await read_upload(file)
+        geo_tagged = lat != "null" and lng != "null"
+
+        cache_key = ResultCache.make_key(contents.digest, endpoint="landfill", mode=mode,
+                                         tta=tta if mode == "sat" else None, **heatmap_options)
+        cached = await run_in_threadpool(get_cached_result, cache_key)
+        if cached is not None:
+            final_score, heatmap = cached["score"], cached["heatmap"]
         else:
-            if ground_engine:
-                results = ground_engine(image_np, verbose=False, conf=0.05)[0]
-                if len(results.boxes) > 0:
-                    yolo_score = float(torch.max(results.boxes.conf).cpu().item())
-                    for box in results.boxes.xyxyn:
-                        x1, y1, x2, y2 = box.cpu().numpy()
-                        cam_signal[int(y1*800):int(y2*800), int(x1*800):int(x2*800)] = 1.0
-            
-            score = (max(yolo_score, chaos_idx * 0.85) * 0.75) + (chaos_idx * 0.45)
-            x0 = 0.22 
-        
-        final_score = 1 / (1 + np.exp(-16 * (score - x0)))
-        final_score = max(0.01, min(final_score, 0.99))
-        
-        print(f"[Neural Trace] Mode: {mode} | YOLO: {yolo_score:.3f} | Chaos: {chaos_idx:.3f} | Raw: {score:.3f} | Final: {final_score:.4f}")
-        
-        heatmap_base64 = generate_heatmap(image_np, cam_signal, mag, mode=mode)
-        
-        status = "Safe"
-        status_type = "success"
+            image_np = await inference_pool.submit(load_landfill_image, contents)
+
+            detections = None
+            if mode != "sat" and ground_engine:
+                # Concurrent ground uploads share one batched YOLO forward
+                detections = await ground_batcher.submit(image_np)
+
+            final_score, heatmap = await inference_pool.submit(
+                run_landfill_analysis, image_np, mode, detections, heatmap_options, tta)
+            await run_in_threadpool(result_cache.put, cache_key,
+                                    {"score": final_score, "heatmap": heatmap})
         
-        if final_score > 0.65:
-            status = "Illegal Dumping"
-            status_type = "danger"
-        elif final_score > 0.30:
-            status = "Suspicious Site"
-            status_type = "warning"
+        status, status_type = classify_landfill_score(final_score)
 
         community_alert = False
-        if lat != "null" and lng != "null":
-            # Save the image to disk
-            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"landfill_{timestamp_str}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            image.save(file_path)
-            # Store relative path for frontend
-            rel_path = f"/uploads/reports/{filename}"
+        if geo_tagged:
+            # Store the upload as-is; relative paths are served to the frontend
+            rel_path, thumb_path = await report_media.save(contents, "landfill")
 
             if status_type == "danger" and final_score > 0.80:
                 community_alert = True
                 
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO reports (lat, lng, score, category, status, image_path, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                         (float(lat), float(lng), final_score, 'landfill', status, rel_path, datetime.now()))
+            await report_store.insert_report(lat, lng, final_score, 'landfill', status, rel_path, thumb_path)
+            report_changes.notify()
             
             if not community_alert:
-                cursor.execute('''SELECT COUNT(*) FROM reports 
-                                WHERE ABS(lat - ?) < 0.001 
-                                AND ABS(lng - ?) < 0.001 
-                                AND status != 'Safe' ''', (float(lat), float(lng)))
-                count = cursor.fetchone()[0]
+                count = await report_store.count_nearby_incidents(lat, lng)
                 if count >= 3: 
                     community_alert = True
-            
-            conn.commit()
-            conn.close()
 
             if community_alert:
                 official = find_nearest_officials(lat, lng)
@@ -238,83 +308,101 @@ async def predict(
             "prediction": status.upper(),
             "status_type": status_type,
             "confidence": round(final_score * 100, 2),
-            "heatmap": f"data:image/png;base64,{heatmap_base64}",
+            **heatmap,
             "geo_tagged": lat != "null",
             "community_alert": community_alert
         }
 
+    except (InferenceQueueFull, ReportMediaBusy) as e:
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"success": False, "error": str(e)})
+    except (ImageTooLarge, UploadTooLarge) as e:
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+    except UnsupportedImage as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
+def run_deforestation_analysis(contents_before, contents_after, heatmap_options=None):
+    """Decodes a before/after pair and measures vegetation loss.
+
+    The 'after' image is only decoded near the 'before' size.
+    Runs on an inference worker thread, never on the event loop.
+    """
+    # Load images
+    img_before_pil = decode_image(contents_before)
+    img_after_pil = decode_image(contents_after, min_size=img_before_pil.size)
+
+    # Resize img_after to img_before if needed
+    if img_after_pil.size != img_before_pil.size:
+        img_after_pil = img_after_pil.resize(img_before_pil.size, Image.BILINEAR)
+
+    img_before_np = np.asarray(img_before_pil)
+    img_after_np = np.asarray(img_after_pil)
+    del img_before_pil, img_after_pil
+
+    # Detect deforestation band by band; large rasters get a downsampled loss overview
+    percent_loss, loss_overview = detect_deforestation_tiled(img_before_np, img_after_np)
+    
+    # Generate heatmap at the overview's resolution
+    if loss_overview.shape != img_after_np.shape[:2]:
+        img_after_np = cv2.resize(img_after_np, (loss_overview.shape[1], loss_overview.shape[0]),
+                                  interpolation=cv2.INTER_AREA)
+        overlay = overlay_heatmap(img_after_np, loss_overview)
+    else:
+        overlay = overlay_heatmap(img_after_np, loss_overview > 0)
+    return percent_loss, heatmap_store.publish(overlay, loss_overview, heatmap_options)
+
 @app.post("/api/analyze/deforestation")
 async def analyze_deforestation(
     before_image: UploadFile = File(...),
     after_image: UploadFile = File(...),
     lat: str = Form("null"),
-    lng: str = Form("null")
+    lng: str = Form("null"),
+    heatmap_delivery: Optional[str] = None,
+    heatmap_format: Optional[str] = None,
+    heatmap_quality: Optional[int] = None
 ):
     try:
-        contents_before = await before_image.read()
-        contents_after = await after_image.read()
-        
-        # Load images
-        img_before_pil = Image.open(io.BytesIO(contents_before)).convert("RGB")
-        img_after_pil = Image.open(io.BytesIO(contents_after)).convert("RGB")
-        
-        img_before_np = np.array(img_before_pil)
-        img_after_np = np.array(img_after_pil)
-
-        # Resize img_after to img_before if needed
-        if img_before_np.shape != img_after_np.shape:
-            img_after_np = np.array(
-                Image.fromarray(img_after_np).resize(
-                    (img_before_np.shape[1], img_before_np.shape[0]),
-                    Image.BILINEAR
-                )
-            )
-
-        # Detect deforestation
-        percent_loss, loss_mask = detect_deforestation(img_before_np, img_after_np)
+        heatmap_options = parse_heatmap_options(heatmap_delivery, heatmap_format, heatmap_quality)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    try:
+        contents_before = await read_upload(before_image, DEFOREST_MAX_UPLOAD_BYTES)
+        contents_after = await read_upload(after_image, DEFOREST_MAX_UPLOAD_BYTES)
+        geo_tagged = lat != "null" and lng != "null"
         
-        # Generate heatmap
-        heatmap_base64 = overlay_heatmap(img_after_np, loss_mask)
+        cache_key = ResultCache.make_key(contents_before.digest, contents_after.digest, endpoint="deforestation",
+                                         **heatmap_options)
+        cached = await run_in_threadpool(get_cached_result, cache_key)
+        if cached is not None:
+            percent_loss, heatmap = cached["vegetation_loss"], cached["heatmap"]
+        else:
+            percent_loss, heatmap = await inference_pool.submit(
+                run_deforestation_analysis, contents_before, contents_after, heatmap_options)
+            await run_in_threadpool(result_cache.put, cache_key,
+                                    {"vegetation_loss": percent_loss, "heatmap": heatmap})
         
-        severity = "Low"
-        status_type = "success"
-        if percent_loss > 30: 
-            severity = "Critical"
-            status_type = "danger"
-        elif percent_loss > 15: 
-            severity = "High"
-            status_type = "warning"
-        elif percent_loss > 5:
-            severity = "Medium"
-            status_type = "info"
+        severity, status_type = classify_deforestation_loss(percent_loss)
             
         # Log to DB if geo-tagged
-        if lat != "null" and lng != "null":
+        if geo_tagged:
             # Save the 'after' image as the primary record
-            timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"deforest_{timestamp_str}.png"
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            img_after_pil.save(file_path)
-            rel_path = f"/uploads/reports/{filename}"
-
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO reports (lat, lng, score, category, status, image_path, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                         (float(lat), float(lng), percent_loss / 100, 'deforestation', severity, rel_path, datetime.now()))
-            conn.commit()
-            conn.close()
+            rel_path, thumb_path = await report_media.save(contents_after, "deforest")
+
+            await report_store.insert_report(lat, lng, percent_loss / 100, 'deforestation', severity,
+                                             rel_path, thumb_path)
+            report_changes.notify()
 
         return {
             "success": True,
             "vegetation_loss": percent_loss,
             "severity": severity,
             "status_type": status_type,
-            "heatmap": f"data:image/png;base64,{heatmap_base64}",
+            **heatmap,
             "geo_tagged": lat != "null",
             "changes": [f"Detecting {percent_loss}% vegetation loss in the specified temporal window."],
             "recommendations": [
@@ -322,61 +410,353 @@ async def analyze_deforestation(
                 "Check for illegal logging permits" if severity != "Low" else "Area appears stable"
             ]
         }
+    except (InferenceQueueFull, ReportMediaBusy) as e:
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"success": False, "error": str(e)})
+    except (ImageTooLarge, UploadTooLarge) as e:
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+    except UnsupportedImage as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
+
+def run_deforestation_series(uploads, heatmap_options=None):
+    """Vegetation loss curve of an ordered image stack and the heatmap of
+    its cumulative loss over the last epoch.
+
+    Runs on an inference worker thread, never on the event loop.
+    """
+    curve, cumulative_mask, last_rgb = analyze_series(uploads, vegetation_masks)
+    overlay = overlay_heatmap(last_rgb, cumulative_mask)
+    return curve, heatmap_store.publish(overlay, cumulative_mask, heatmap_options)
+
+@app.post("/api/analyze/deforestation/series")
+async def analyze_deforestation_series(
+    images: List[UploadFile] = File(...),
+    heatmap_delivery: Optional[str] = None,
+    heatmap_format: Optional[str] = None,
+    heatmap_quality: Optional[int] = None
+):
+    """Tracks one site across an ordered stack of acquisitions (oldest first)."""
+    try:
+        heatmap_options = parse_heatmap_options(heatmap_delivery, heatmap_format, heatmap_quality)
+        if not 2 <= len(images) <= DEFOREST_SERIES_MAX_EPOCHS:
+            raise ValueError(f"Send between 2 and {DEFOREST_SERIES_MAX_EPOCHS} images, oldest first")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+    try:
+        uploads = [await read_upload(image) for image in images]
+
+        cache_key = ResultCache.make_key(*(upload.digest for upload in uploads),
+                                         endpoint="deforestation_series", **heatmap_options)
+        cached = await run_in_threadpool(get_cached_result, cache_key)
+        if cached is not None:
+            curve, heatmap = cached["loss_curve"], cached["heatmap"]
+        else:
+            curve, heatmap = await inference_pool.submit(run_deforestation_series, uploads, heatmap_options)
+            await run_in_threadpool(result_cache.put, cache_key, {"loss_curve": curve, "heatmap": heatmap})
+
+        percent_loss = curve[-1]["cumulative_loss"]
+        severity, status_type = classify_deforestation_loss(percent_loss)
+        return {
+            "success": True,
+            "epochs": len(curve),
+            "loss_curve": curve,
+            "vegetation_loss": percent_loss,
+            "severity": severity,
+            "status_type": status_type,
+            **heatmap,
+        }
+    except InferenceQueueFull as e:
+        return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                            content={"success": False, "error": str(e)})
+    except (ImageTooLarge, UploadTooLarge) as e:
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+    except UnsupportedImage as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
+def _spool_upload(upload_file, max_bytes):
+    """Copies an upload to a private temporary file, enforcing max_bytes
+    (the Content-Length check does not cover chunked requests)."""
+    spool = tempfile.TemporaryFile()
+    try:
+        upload_file.file.seek(0)
+        size = 0
+        while True:
+            chunk = upload_file.file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+            spool.write(chunk)
+        spool.seek(0)
+        # Mosaics are refused up front (format, pixel count) instead of mid-stream
+        if not zipfile.is_zipfile(spool):
+            probe_image(spool)
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+
+@app.post("/api/scan/tiles")
+async def scan_tiles(
+    file: UploadFile = File(...),
+    tile_size: int = Form(800),
+    batch_size: int = Form(0),
+    format: str = Form("ndjson")
+):
+    """
+    Bulk aerial scan of a mosaic (PNG/TIFF/GeoTIFF) or a zip of tiles.
+    Streams one score record per tile as NDJSON or Server-Sent Events.
+    """
+    if format not in ("ndjson", "sse"):
+        return JSONResponse(status_code=400, content={"success": False, "error": "format must be 'ndjson' or 'sse'"})
+    if tile_size < 64:
+        return JSONResponse(status_code=400, content={"success": False, "error": "tile_size must be at least 64"})
+
+    # The upload is closed once this handler returns, before streaming starts
+    try:
+        spool = await run_in_threadpool(_spool_upload, file, SCAN_MAX_UPLOAD_BYTES)
+    except (ImageTooLarge, UploadTooLarge) as e:
+        return JSONResponse(status_code=413, content={"success": False, "error": str(e)})
+    except UnsupportedImage as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    batches = tile_scanner.scan(iter_tiles(spool, tile_size), batch_size or None)
+
+    def encode(record, event="tile"):
+        if format == "sse":
+            return f"event: {event}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+
+    async def stream():
+        scanned = 0
+        try:
+            while True:
+                try:
+                    records = await inference_pool.submit(next, batches, None)
+                except InferenceQueueFull:
+                    # The 503 backpressure is for new requests; a running
+                    # scan waits for a free slot instead of ending part-way
+                    await asyncio.sleep(SCAN_RETRY_SECONDS)
+                    continue
+                if records is None:
+                    break
+                for record in records:
+                    scanned += 1
+                    yield encode(record)
+            yield encode({"done": True, "tiles": scanned}, event="done")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield encode({"done": False, "tiles": scanned, "error": str(e)}, event="error")
+        finally:
+            spool.close()
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type)
+
+REPORTS_PAGE_SIZE = int(os.getenv("REPORTS_PAGE_SIZE", 100))
+REPORTS_MAX_PAGE_SIZE = 1000
+
 @app.get("/api/reports")
-async def get_reports():
+async def get_reports(
+    limit: int = REPORTS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    min_lat: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    min_lng: Optional[float] = None,
+    max_lng: Optional[float] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    search: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    One page of reports, newest first. Pass the returned `next_cursor` as
+    `cursor` to fetch the following page.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM reports ORDER BY timestamp DESC")
-        rows = cursor.fetchall()
-        
-        # Get column names
-        cursor.execute("PRAGMA table_info(reports)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        reports = []
-        for row in rows:
-            report = dict(zip(columns, row))
-            reports.append(report)
-            
-        conn.close()
-        return {"success": True, "reports": reports}
+        bbox = _report_bbox(min_lat, min_lng, max_lat, max_lng)
+        limit = max(1, min(limit, REPORTS_MAX_PAGE_SIZE))
+        # Read before listing so the change feed can only replay, never skip
+        change_cursor = await report_store.latest_change()
+        reports, next_cursor = await report_store.list_reports(
+            limit=limit, cursor=cursor, category=category, status=status,
+            min_score=min_score, max_score=max_score, bbox=bbox,
+            since=since, until=until, search=search,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None)
+        return {"success": True, "reports": reports, "next_cursor": next_cursor,
+                "change_cursor": change_cursor}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
+# Score above which the dashboard flags a report as critical
+CRITICAL_SCORE = 0.4
+
+@app.get("/api/reports/stats")
+async def get_report_stats(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    min_lat: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    min_lng: Optional[float] = None,
+    max_lng: Optional[float] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    search: Optional[str] = None,
+    critical_score: float = CRITICAL_SCORE
+):
+    """
+    Counts of all the reports matching the /api/reports filters, not just
+    one page: total, per category and above `critical_score`.
+    """
+    try:
+        stats = await report_store.report_stats(
+            critical_score, category=category, status=status,
+            min_score=min_score, max_score=max_score,
+            bbox=_report_bbox(min_lat, min_lng, max_lat, max_lng),
+            since=since, until=until, search=search)
+        return {"success": True, **stats}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
+
+def _report_bbox(min_lat, min_lng, max_lat, max_lng):
+    bbox = (min_lat, min_lng, max_lat, max_lng)
+    if all(v is None for v in bbox):
+        return None
+    if any(v is None for v in bbox):
+        raise ValueError("min_lat, min_lng, max_lat and max_lng must be given together")
+    return bbox
+
+@app.get("/api/reports/changes")
+async def get_report_changes(since: int = 0, limit: int = 500):
+    """
+    Reports added and ids removed after change cursor `since` (the
+    `change_cursor` of /api/reports or the `cursor` of a previous call).
+    """
+    try:
+        changes = await report_store.changes_since(since, max(1, min(limit, REPORTS_MAX_PAGE_SIZE)))
+        return {"success": True, **changes}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
+
+REPORT_STREAM_POLL_SECONDS = float(os.getenv("REPORT_STREAM_POLL_SECONDS", 15))
+
+@app.get("/api/reports/stream")
+async def stream_report_changes(since: Optional[int] = None):
+    """
+    Server-Sent Events feed of report changes. Inserts and deletes in this
+    process are pushed immediately; changes made elsewhere arrive within
+    REPORT_STREAM_POLL_SECONDS, which is also the keep-alive interval.
+    """
+    if since is None:
+        since = await report_store.latest_change()
+
+    async def stream():
+        cursor = since
+        wake_up = report_changes.subscribe()
+        try:
+            yield f"event: ready\ndata: {json.dumps({'cursor': cursor})}\n\n"
+            while True:
+                changes = await report_store.changes_since(cursor)
+                if changes["cursor"] != cursor or changes["reset"]:
+                    cursor = changes["cursor"]
+                    yield f"event: changes\ndata: {json.dumps(changes)}\n\n"
+                    continue
+                if not await report_changes.wait(wake_up, REPORT_STREAM_POLL_SECONDS):
+                    yield ": keep-alive\n\n"
+        finally:
+            report_changes.unsubscribe(wake_up)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _remove_report_image(img_rel_path):
+    # Convert /uploads/reports/filename to full path
+    # Remove leading slash if it exists for os.path.join
+    clean_rel_path = img_rel_path.lstrip('/')
+    full_img_path = os.path.join(BASE_DIR, clean_rel_path)
+    if os.path.exists(full_img_path):
+        os.remove(full_img_path)
+
 @app.delete("/api/reports/{report_id}")
 async def delete_report(report_id: int):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get image path before deleting
-        cursor.execute("SELECT image_path FROM reports WHERE id = ?", (report_id,))
-        row = cursor.fetchone()
-        if row and row[0]:
-            img_rel_path = row[0]
-            # Convert /uploads/reports/filename to full path
-            # Remove leading slash if it exists for os.path.join
-            clean_rel_path = img_rel_path.lstrip('/')
-            full_img_path = os.path.join(BASE_DIR, clean_rel_path)
-            if os.path.exists(full_img_path):
-                os.remove(full_img_path)
-
-        cursor.execute("DELETE FROM reports WHERE id = ?", (report_id,))
-        conn.commit()
-        conn.close()
+        img_rel_paths = await report_store.delete_report(report_id)
+        report_changes.notify()
+        # Images of a fresh report may still be queued for writing
+        report_media.discard(img_rel_paths)
+        for img_rel_path in img_rel_paths:
+            await run_in_threadpool(_remove_report_image, img_rel_path)
         return {"success": True}
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
 
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "inference": inference_pool.stats(),
+        "ground_batching": ground_batcher.stats(),
+        "result_cache": result_cache.stats(),
+        "report_media": report_media.stats(),
+        "vegetation_masks": vegetation_masks.stats(),
+        "heatmaps": heatmap_store.stats(),
+    }
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {"success": True, "cache": result_cache.stats()}
+
+@app.on_event("startup")
+async def start_warmup():
+    # Warm up in the background: /api/health answers at once while
+    # /api/ready stays 503 until every engine has run a forward.
+    app.state.warmup_task = asyncio.create_task(_warm_up())
+
+@app.on_event("shutdown")
+async def flush_report_media():
+    # Let queued report images and thumbnails finish writing
+    await run_in_threadpool(report_media.shutdown)
+
+async def _warm_up():
+    start = time.perf_counter()
+    try:
+        await inference_pool.submit(warm_up_engines)
+        readiness["ready"] = True
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        readiness["error"] = str(e)
+    readiness["phases"]["startup_total"] = round(time.perf_counter() - start, 3)
+    print(f"[Startup] Ready: {readiness['ready']} | Phases: {readiness['phases']}")
+
+@app.get("/api/ready")
+async def ready():
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=readiness)
+
 @app.get("/api/health")
 async def health():
-    return {"status": "healthy", "device": device}
+    return {"status": "healthy", "device": device, "inference": inference_pool.stats()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,46 @@
+"""
+Bulk aerial scan from the command line.
+
+Scores every tile of a mosaic (PNG/TIFF/GeoTIFF) or of a zip of tiles with
+the same pipeline as `/api/scan/tiles` and prints one JSON record per tile
+(NDJSON) as soon as its batch finishes.
+
+    python scan_tiles.py district.tif --tile-size 800 --batch-size 8 > scores.ndjson
+"""
+import argparse
+import json
+import os
+import sys
+
+from utils.image_processor import ImageProcessor
+from utils.model_backends import BACKENDS
+from utils.tile_scanner import MODEL_INPUT_SIZE, TileScanner, iter_tiles
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream per-tile landfill scores for a mosaic or a zip of tiles.")
+    parser.add_argument("source", help="Mosaic image or zip archive of tiles")
+    parser.add_argument("--tile-size", type=int, default=MODEL_INPUT_SIZE, help="Mosaic tile edge in pixels")
+    parser.add_argument("--batch-size", type=int, default=None, help="Tiles per batch (one forward per batch only for models that do not fuse the flipped pair)")
+    parser.add_argument("--checkpoint", default=os.path.join(BASE_DIR, "models", "aerial", "checkpoint.pth"))
+    parser.add_argument("--model", default="models.aerial.resnet50_fpn")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="Inference backend (default: INFERENCE_BACKEND)")
+    args = parser.parse_args(argv)
+
+    engine = ImageProcessor(["suspicious_site"], args.checkpoint, model=args.model, scales=(1.0,),
+                            backend=args.backend)
+    scanner = TileScanner(engine, batch_size=args.batch_size)
+
+    scanned = 0
+    for records in scanner.scan(iter_tiles(args.source, args.tile_size)):
+        for record in records:
+            sys.stdout.write(json.dumps(record) + "\n")
+            scanned += 1
+        sys.stdout.flush()
+    print(f"Scanned {scanned} tiles", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
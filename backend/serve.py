@@ -0,0 +1,134 @@
+"""
+Pre-fork multi-process server.
+
+Imports the app once in a parent process, loads the aerial and ground model
+weights there and builds YOLO's fused predictor, then forks `--workers`
+uvicorn processes that accept on one shared listening socket. The workers
+inherit the loaded weights copy-on-write (the aerial checkpoint is also
+memory-mapped), so adding a worker does not add a copy of ResNet50 and
+YOLOv8 to the machine's memory, only its own activations. Each worker runs
+its own warm-up forward; `/api/ready` of a worker turns 200 once it has.
+Workers that die are replaced from the parent.
+
+    cd backend && python serve.py --workers 4 --port 8000
+
+CPU inference only: CUDA cannot be used in a process forked after it was
+initialized, so on GPU hosts every worker loads its own models.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME = 5.0
+
+
+def split_cpus(workers):
+    """Divides the cores between the workers' inference threads and torch's
+    intra-op threads, unless set explicitly. Must run before `main` is imported."""
+    per_worker = max(1, (os.cpu_count() or 1) // workers)
+    os.environ.setdefault("INFERENCE_WORKERS", str(max(1, per_worker // 2)))
+    os.environ.setdefault("TORCH_THREADS", str(max(1, per_worker // int(os.environ["INFERENCE_WORKERS"]))))
+
+
+def listen(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, log_level):
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from several pre-forked worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    workers = max(1, args.workers)
+    split_cpus(workers)
+
+    import torch
+    import main as service
+
+    if torch.cuda.is_available():
+        print("[Serve] CUDA device found; weights are loaded by each worker, not before fork")
+    else:
+        timings = service.preload_engines()
+        print(f"[Serve] Weights loaded before fork: {timings}")
+
+    sock = listen(args.host, args.port)
+    # Objects created so far are never collected in the workers, so the GC
+    # does not write to (and un-share) the pages holding them
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(service.app, sock, args.log_level)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"[Serve] {workers} workers on {args.host}:{args.port} "
+          f"({os.environ['INFERENCE_WORKERS']} inference threads x {os.environ['TORCH_THREADS']} torch threads each)")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"[Serve] Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        if not stopping:
+            spawn()
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+from fastapi.staticfiles import StaticFiles
+
+HEATMAP_FORMATS = {"png": ".png", "webp": ".webp", "jpeg": ".jpg"}
+HEATMAP_MIME_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+HEATMAP_DELIVERIES = ("url", "inline", "mask")
+# Seconds between retention sweeps while the store is under its size cap
+SWEEP_INTERVAL = 300
+
+
+def parse_heatmap_options(delivery=None, fmt=None, quality=None):
+    """
+    Validates the heatmap options of a request, falling back to the
+    HEATMAP_DELIVERY / HEATMAP_FORMAT / HEATMAP_QUALITY defaults.
+    """
+    delivery = (delivery or os.getenv("HEATMAP_DELIVERY", "url")).lower()
+    fmt = (fmt or os.getenv("HEATMAP_FORMAT", "png")).lower()
+    if quality is None and os.getenv("HEATMAP_QUALITY"):
+        quality = int(os.getenv("HEATMAP_QUALITY"))
+    if delivery not in HEATMAP_DELIVERIES:
+        raise ValueError(f"heatmap_delivery must be one of: {', '.join(HEATMAP_DELIVERIES)}")
+    if fmt not in HEATMAP_FORMATS:
+        raise ValueError(f"heatmap_format must be one of: {', '.join(HEATMAP_FORMATS)}")
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError("heatmap_quality must be between 1 and 100")
+    return {"delivery": delivery, "format": fmt, "quality": quality}
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for rendered heatmaps.
+    Files are named after the hash of their bytes, so a URL never changes
+    content and can be cached forever by browsers and proxies.
+
+    Retention: a file's mtime is its last use (publish or cache hit). Files
+    unused for `ttl` seconds are swept, and beyond `max_bytes` the least
+    recently used go first. Sweeps run every SWEEP_INTERVAL seconds, or as
+    soon as the files written since the last sweep may exceed the cap.
+    """
+
+    def __init__(self, root_dir, url_prefix, mask_size=None, max_bytes=None, ttl=None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("HEATMAP_STORE_MB", 1024)) * 1024 * 1024
+        if ttl is None:
+            # Never shorter than the result cache's, whose entries point here
+            ttl = max(float(os.getenv("HEATMAP_TTL", 86400)), float(os.getenv("RESULT_CACHE_TTL", 3600)))
+        self.root_dir = root_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.mask_size = mask_size or int(os.getenv("HEATMAP_MASK_SIZE", 200))
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_sweep = 0.0
+        self._swept_files = 0
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.sweep()
+
+    def encode(self, image_rgb, fmt="png", quality=None):
+        """Encodes an RGB (or single channel) image; returns the bytes"""
+        params = []
+        if fmt == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, quality or 90]
+        elif fmt == "jpeg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, quality or 90]
+        elif quality is not None:
+            # For PNG, map quality 1-100 onto zlib compression 9-0
+            params = [cv2.IMWRITE_PNG_COMPRESSION, int(round((100 - quality) * 9 / 99))]
+
+        if image_rgb.ndim == 3:
+            image_rgb = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+        ok, buffer = cv2.imencode(HEATMAP_FORMATS[fmt], image_rgb, params)
+        if not ok:
+            raise RuntimeError(f"Could not encode heatmap as {fmt}")
+        return buffer.tobytes()
+
+    def put(self, data, fmt):
+        """Stores encoded bytes and returns their public URL"""
+        name = hashlib.sha256(data).hexdigest()[:32] + HEATMAP_FORMATS[fmt]
+        path = os.path.join(self.root_dir, name)
+        if not self._touch(path):
+            # Write-then-rename so a concurrent reader never sees a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._bytes += len(data)
+        self._maybe_sweep()
+        return f"{self.url_prefix}/{name}"
+
+    def refresh(self, fields):
+        """
+        Marks the artifacts referenced by published response fields (see
+        `publish`) as used. Returns False when one of them has been swept,
+        so a cached result pointing at it must be recomputed.
+        """
+        for value in fields.values():
+            if isinstance(value, str) and value.startswith(self.url_prefix + "/"):
+                if not self._touch(os.path.join(self.root_dir, os.path.basename(value))):
+                    return False
+        return True
+
+    def sweep(self):
+        """Removes expired artifacts, then the least recently used ones
+        until the store fits in max_bytes. Returns the number removed."""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.root_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.is_file():
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        # Going over the cap evicts down to 90% of it, so the next few puts
+        # do not each trigger another sweep
+        target = self.max_bytes if total <= self.max_bytes else self.max_bytes * 0.9
+        removed = 0
+        for mtime, size, path in entries:
+            expired = now - mtime > self.ttl
+            if not expired and total <= target:
+                break
+            # A .tmp file is a write in progress, or a leftover of a crashed
+            # one once expired
+            if path.endswith(".tmp") and not expired:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._bytes = total
+            self._last_sweep = now
+            self._swept_files += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"bytes": self._bytes, "max_bytes": self.max_bytes, "ttl_seconds": self.ttl,
+                    "swept_files": self._swept_files}
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _maybe_sweep(self):
+        with self._lock:
+            due = self._bytes > self.max_bytes or time.time() - self._last_sweep > SWEEP_INTERVAL
+            if due:
+                # Claim this sweep so concurrent puts do not start their own
+                self._last_sweep = time.time()
+        if due:
+            self.sweep()
+
+    def publish(self, overlay_rgb, mask, options):
+        """
+        Publishes a rendered heatmap according to the request's options and
+        returns the response fields:
+        - url: the colorized overlay stored as an artifact, returned by URL
+        - inline: the colorized overlay as a base64 data URI
+        - mask: only a low-resolution grayscale intensity mask (0-255) for
+          client-side colorizing
+        """
+        if options["delivery"] == "mask":
+            mask_u8 = self.downsample_mask(mask)
+            return {"heatmap": None, "heatmap_mask": self.put(self.encode(mask_u8, "png"), "png")}
+
+        data = self.encode(overlay_rgb, options["format"], options["quality"])
+        if options["delivery"] == "inline":
+            mime = HEATMAP_MIME_TYPES[options["format"]]
+            return {"heatmap": f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"}
+        return {"heatmap": self.put(data, options["format"])}
+
+    def downsample_mask(self, mask):
+        mask = np.asarray(mask, dtype=np.float32)
+        h, w = mask.shape[:2]
+        scale = min(1.0, self.mask_size / max(h, w))
+        if scale < 1.0:
+            mask = cv2.resize(mask, (max(1, int(w * scale)), max(1, int(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        return np.uint8(np.clip(mask, 0, 1) * 255)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose content never changes for a given URL"""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
@@ -0,0 +1,39 @@
+import asyncio
+
+
+class ChangeNotifier:
+    """Wakes up report-stream subscribers when the reports table changes.
+
+    Only a wake-up signal is broadcast; subscribers read the actual changes
+    from the `report_events` table, so a missed signal (or a change written
+    by another worker process) is picked up on the next poll.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+
+    def subscribe(self) -> asyncio.Event:
+        event = asyncio.Event()
+        self._subscribers.add(event)
+        return event
+
+    def unsubscribe(self, event: asyncio.Event):
+        self._subscribers.discard(event)
+
+    def notify(self):
+        for event in self._subscribers:
+            event.set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @staticmethod
+    async def wait(event: asyncio.Event, timeout: float) -> bool:
+        """Waits for a notification; False when `timeout` elapsed first"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        event.clear()
+        return True
@@ -0,0 +1,137 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from utils.forest_processor import vegetation_mask_rgb
+from utils.ingest import load_rgb_array, probe_image
+
+# Longest side every epoch of a series is compared at
+SERIES_MAX_SIZE = int(os.getenv("DEFOREST_SERIES_SIZE", 2048))
+
+
+class VegetationMaskCache:
+    """LRU cache of vegetation masks keyed by image content hash.
+
+    Masks are stored bit-packed (one bit per pixel), so a 2048x2048 mask
+    costs 512 KiB. The budget is in bytes. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("VEG_MASK_CACHE_MB", 128)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(digest: bytes, size, threshold) -> tuple:
+        return digest, tuple(size), float(threshold)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        packed, shape = entry
+        return np.unpackbits(packed, count=shape[0] * shape[1]).reshape(shape).astype(bool)
+
+    def put(self, key, mask):
+        packed = np.packbits(mask, axis=None)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0].nbytes
+            self._entries[key] = (packed, mask.shape)
+            self._bytes += packed.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                self._bytes -= self._entries.popitem(last=False)[1][0].nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def series_size(width, height, max_size=None):
+    """The (width, height) every epoch is compared at: the first epoch's
+    size, scaled down to fit max_size"""
+    max_size = max_size or SERIES_MAX_SIZE
+    scale = min(1.0, max_size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def epoch_vegetation(upload, size, cache, threshold=0.1):
+    """Vegetation mask of one epoch at `size`, decoded at most once per
+    content hash while it stays cached. Returns (mask, rgb or None); the
+    RGB frame is only decoded on a cache miss."""
+    key = cache.make_key(upload.digest, size, threshold)
+    mask = cache.get(key)
+    if mask is not None:
+        return mask, None
+    image_np = load_rgb_array(upload, size)
+    mask = vegetation_mask_rgb(image_np, threshold)
+    cache.put(key, mask)
+    return mask, image_np
+
+
+def analyze_series(uploads, cache, threshold=0.1, max_size=None):
+    """
+    Vegetation loss across an ordered stack of acquisitions of one site.
+
+    Every epoch is masked once (or fetched from `cache`) at a common size
+    and compared against its predecessor and against the first epoch in a
+    single pass; only the baseline, previous and current masks are held.
+
+    Returns the per-epoch curve, the cumulative loss mask (vegetated in the
+    first epoch, not in the last) and the last epoch's RGB frame at the
+    common size for rendering.
+    """
+    _, first_size = probe_image(uploads[0])
+    size = series_size(*first_size, max_size=max_size)
+
+    baseline = previous = None
+    baseline_veg = previous_veg = 0
+    curve = []
+    last_rgb = None
+    for epoch, upload in enumerate(uploads):
+        mask, image_np = epoch_vegetation(upload, size, cache, threshold)
+        vegetated = int(np.count_nonzero(mask))
+        point = {
+            "epoch": epoch,
+            "vegetation_cover": round(vegetated / mask.size * 100, 2),
+            "loss_since_previous": 0.0,
+            "cumulative_loss": 0.0,
+        }
+        if baseline is None:
+            baseline, baseline_veg = mask, vegetated
+        else:
+            lost = int(np.count_nonzero(previous & ~mask))
+            point["loss_since_previous"] = round(lost / previous_veg * 100, 2) if previous_veg else 0.0
+            lost_total = int(np.count_nonzero(baseline & ~mask))
+            point["cumulative_loss"] = round(lost_total / baseline_veg * 100, 2) if baseline_veg else 0.0
+        curve.append(point)
+        previous, previous_veg = mask, vegetated
+        if epoch == len(uploads) - 1:
+            last_rgb = image_np
+
+    if last_rgb is None:
+        # The last epoch's mask came from the cache; decode it for the overlay
+        last_rgb = load_rgb_array(uploads[-1], size)
+    cumulative_mask = baseline & ~previous
+    return curve, cumulative_mask, last_rgb
+
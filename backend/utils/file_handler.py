@@ -4,6 +4,8 @@ import aiofiles
 from typing import Optional
 import uuid
 from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from utils.ingest import UPLOAD_CHUNK_BYTES, UploadTooLarge, probe_image
 
 
 class FileHandler:
@@ -28,7 +30,12 @@ class FileHandler:
         return True
     
     async def save_upload_file(self, upload_file: UploadFile, prefix: str = "") -> str:
-        """Save uploaded file and return path"""
+        """Save uploaded file and return path.
+
+        The upload is streamed to disk in chunks. Raises ValueError when its
+        header is not a supported image or declares too many pixels, and
+        UploadTooLarge past max_file_size; nothing is kept in either case.
+        """
         # Generate unique filename
         file_ext = upload_file.filename.split(".")[-1].lower()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -37,10 +44,22 @@ class FileHandler:
         
         file_path = os.path.join(self.upload_folder, filename)
         
+        if upload_file.size is not None and upload_file.size > self.max_file_size:
+            raise UploadTooLarge(f"Upload is {upload_file.size} bytes; the limit is {self.max_file_size}")
+        await run_in_threadpool(probe_image, upload_file.file)
+        await upload_file.seek(0)
+
         # Save file
+        written = 0
         async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await upload_file.read()
-            await out_file.write(content)
+            while chunk := await upload_file.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > self.max_file_size:
+                    break
+                await out_file.write(chunk)
+        if written > self.max_file_size:
+            self.cleanup_file(file_path)
+            raise UploadTooLarge(f"Upload exceeds the {self.max_file_size} byte limit")
         
         return file_path
     
@@ -1,41 +1,208 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import cv2
-from PIL import Image
-import io
-import base64
 
-def vegetation_mask_rgb(image_np, threshold=0.1):
+# Rows per band of the tiled change detection; bounds its working memory
+DEFOREST_TILE_ROWS = int(os.getenv("DEFOREST_TILE_ROWS", 256))
+# Longest side of the loss-mask overview returned for large rasters
+DEFOREST_OVERVIEW_SIZE = int(os.getenv("DEFOREST_OVERVIEW_SIZE", 2048))
+# Threads the bands and the overlay are split across (NumPy and OpenCV
+# release the GIL); 1 runs everything on the calling thread
+DEFOREST_WORKERS = int(os.getenv("DEFOREST_WORKERS", min(4, os.cpu_count() or 1)))
+# Images below this many pixels are overlaid on the calling thread
+PARALLEL_MIN_PIXELS = 1 << 20
+
+_band_pools = {}
+_band_pools_lock = threading.Lock()
+
+
+def _band_pool(workers):
+    """Shared thread pool for band-parallel work, one per worker count"""
+    with _band_pools_lock:
+        pool = _band_pools.get(workers)
+        if pool is None:
+            pool = _band_pools[workers] = ThreadPoolExecutor(max_workers=workers,
+                                                             thread_name_prefix="deforest")
+        return pool
+
+
+def _map_bands(fn, starts, workers):
+    """Runs fn(y0) for every band start, on the band pool when workers > 1"""
+    starts = list(starts)
+    if workers <= 1 or len(starts) <= 1:
+        return [fn(y0) for y0 in starts]
+    return list(_band_pool(workers).map(fn, starts))
+
+# Per threshold: for each green level, how many red levels pass the index test
+_red_limits = {}
+
+
+def _vegetation_red_limits(threshold):
+    """
+    uint8 table `limit` such that, for uint8 pixels, the vegetation test
+    (g - r) / (g + r + 1e-5) > threshold is exactly `r < limit[g]`.
+    The index falls as r grows, so for each g the passing r form a prefix;
+    the table is derived from the float64 formula itself and checked, and
+    is None when a threshold cannot be expressed this way.
+    """
+    if threshold not in _red_limits:
+        g = np.arange(256, dtype=np.float64)[:, np.newaxis]
+        r = np.arange(256, dtype=np.float64)[np.newaxis, :]
+        passes = (g - r) / (g + r + 1e-5) > threshold
+        counts = passes.sum(axis=1)
+        is_prefix = (passes == (np.arange(256) < counts[:, np.newaxis])).all()
+        _red_limits[threshold] = counts.astype(np.uint8) if is_prefix and counts.max() < 256 else None
+    return _red_limits[threshold]
+
+
+def _vegetation_mask_float(image_np, threshold):
     r = image_np[:, :, 0].astype(float)
     g = image_np[:, :, 1].astype(float)
-    b = image_np[:, :, 2].astype(float)
 
     # Excess Green Index (ExG) or simple ratio
     vegetation_index = (g - r) / (g + r + 1e-5)
     return vegetation_index > threshold
 
+
+def vegetation_mask_rgb(image_np, threshold=0.1):
+    """
+    Pixels whose green/red ratio index exceeds `threshold`.
+    uint8 images take a division-free path: a 256-entry table lookup on
+    the green channel and one comparison with the red channel.
+    """
+    limits = _vegetation_red_limits(threshold) if image_np.dtype == np.uint8 else None
+    if limits is None:
+        return _vegetation_mask_float(image_np, threshold)
+    red, green = cv2.split(np.ascontiguousarray(image_np))[:2]
+    return red < cv2.LUT(green, limits)
+
+
+def vegetation_loss(img1_np, img2_np, threshold=0.1):
+    """
+    Fused before/after vegetation test.
+    Returns the loss mask (vegetated before, not after) and the number of
+    vegetated pixels before.
+    """
+    vegetated = vegetation_mask_rgb(img1_np, threshold)
+    limits = _vegetation_red_limits(threshold) if img2_np.dtype == np.uint8 else None
+    if limits is None:
+        lost = vegetated & ~_vegetation_mask_float(img2_np, threshold)
+    else:
+        red, green = cv2.split(np.ascontiguousarray(img2_np))[:2]
+        # Not vegetated after: r >= limit[g], written in place of the LUT output
+        lost = np.greater_equal(red, cv2.LUT(green, limits))
+        np.logical_and(lost, vegetated, out=lost)
+    return lost, int(np.count_nonzero(vegetated))
+
+
 def detect_deforestation(img1_np, img2_np):
-    mask1 = vegetation_mask_rgb(img1_np)
-    mask2 = vegetation_mask_rgb(img2_np)
+    vegetation_loss_mask, total_veg = vegetation_loss(img1_np, img2_np)
+    lost_veg = np.count_nonzero(vegetation_loss_mask)
+
+    percent = (lost_veg / total_veg) * 100 if total_veg > 0 else 0
+    return round(percent, 2), vegetation_loss_mask
+
+
+def classify_deforestation_loss(percent_loss):
+    """Maps a vegetation loss percentage to its (severity, status_type) labels."""
+    if percent_loss > 30:
+        return "Critical", "danger"
+    if percent_loss > 15:
+        return "High", "warning"
+    if percent_loss > 5:
+        return "Medium", "info"
+    return "Low", "success"
 
-    vegetation_loss = mask1 & (~mask2)
 
-    total_veg = mask1.sum()
-    lost_veg = vegetation_loss.sum()
+def overview_factor(height, width, overview_size=None):
+    """Integer downsampling factor that fits a raster within overview_size"""
+    overview_size = overview_size or DEFOREST_OVERVIEW_SIZE
+    return max(1, -(-max(height, width) // overview_size))
+
+
+def detect_deforestation_tiled(img1_np, img2_np, tile_rows=None, overview_size=None, workers=None):
+    """
+    Memory-bounded `detect_deforestation` for large rasters.
+
+    The aligned before/after images (arrays or np.memmap rasters of equal
+    shape) are processed in bands of `tile_rows` rows, so only one band's
+    masks exist at a time; vegetation counts are accumulated per band.
+    Returns the loss percentage and the loss mask as a float32 overview,
+    each cell holding the fraction of lost pixels of its factor x factor
+    block (see `overview_factor`). Below overview_size the overview is the
+    full-resolution mask and the result equals `detect_deforestation`.
+
+    Bands run on `workers` threads (DEFOREST_WORKERS by default); each
+    writes its own overview rows, so the result does not depend on it.
+    """
+    height, width = img1_np.shape[:2]
+    factor = overview_factor(height, width, overview_size)
+    # Bands start on block boundaries so each one fills whole overview rows
+    rows = max(factor, (tile_rows or DEFOREST_TILE_ROWS) // factor * factor)
+    overview = np.empty((-(-height // factor), -(-width // factor)), dtype=np.float32)
+
+    def process(y0):
+        y1 = min(height, y0 + rows)
+        band_loss, band_veg = vegetation_loss(img1_np[y0:y1], img2_np[y0:y1])
+        overview[y0 // factor:-(-y1 // factor)] = _block_mean(band_loss, factor)
+        return band_veg, int(np.count_nonzero(band_loss))
+
+    counts = _map_bands(process, range(0, height, rows), workers or DEFOREST_WORKERS)
+    total_veg = sum(band_veg for band_veg, _ in counts)
+    lost_veg = sum(band_lost for _, band_lost in counts)
 
     percent = (lost_veg / total_veg) * 100 if total_veg > 0 else 0
-    return round(percent, 2), vegetation_loss
+    return round(percent, 2), overview
+
+
+def _block_mean(mask, factor):
+    """Fraction of set pixels per factor x factor block (edge blocks may be smaller)"""
+    if factor == 1:
+        return mask
+    h, w = mask.shape
+    bh, bw = -(-h // factor), -(-w // factor)
+    padded = np.zeros((bh * factor, bw * factor), dtype=np.uint16)
+    padded[:h, :w] = mask
+    sums = padded.reshape(bh, factor, bw, factor).sum(axis=(1, 3), dtype=np.float32)
+    rows = np.minimum(factor, h - np.arange(bh) * factor)
+    cols = np.minimum(factor, w - np.arange(bw) * factor)
+    return sums / np.outer(rows, cols)
 
-def overlay_heatmap(image, mask, alpha=0.5):
+
+def overlay_heatmap(image, mask, alpha=0.5, workers=None):
     """
     image: H x W x 3 (RGB)
-    mask: H x W (boolean)
+    mask: H x W (boolean, or float loss fraction in [0, 1])
+    Returns the blended H x W x 3 (RGB) overlay. Large images are blended
+    in row bands on `workers` threads (DEFOREST_WORKERS by default).
     """
-    heatmap = image.copy()
+    workers = workers or DEFOREST_WORKERS
+    height = image.shape[0]
+    if workers <= 1 or image.shape[0] * image.shape[1] < PARALLEL_MIN_PIXELS:
+        return _overlay_rows(image, mask, alpha)
+
+    blended = np.empty(image.shape, dtype=np.uint8)
+    rows = -(-height // workers)
+
+    def process(y0):
+        blended[y0:y0 + rows] = _overlay_rows(image[y0:y0 + rows], mask[y0:y0 + rows], alpha)
+
+    _map_bands(process, range(0, height, rows), workers)
+    return blended
+
 
-    # Red overlay for deforestation
-    heatmap[mask] = [255, 0, 0]
+def _overlay_rows(image, mask, alpha):
+    if mask.dtype == bool:
+        heatmap = image.copy()
+        # Red overlay for deforestation
+        heatmap[mask] = [255, 0, 0]
+    else:
+        # Red in proportion to the loss fraction of each overview cell
+        weight = mask[:, :, np.newaxis].astype(np.float64)
+        heatmap = image + weight * (np.array([255, 0, 0]) - image)
 
     blended = (alpha * heatmap + (1 - alpha) * image).astype(np.uint8)
-    
-    _, buffer = cv2.imencode('.png', cv2.cvtColor(blended, cv2.COLOR_RGB2BGR))
-    return base64.b64encode(buffer).decode('utf-8')
+    return blended
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
 from importlib import import_module
 
 import numpy as np
@@ -8,6 +10,8 @@ import torch.nn.functional as F
 from PIL import Image
 
 from utils.image_wrapper import ImageWrapper
+from utils.model_backends import (INFERENCE_BACKEND, PreparedModel,
+                                  default_int8_path, load_int8, load_weights)
 from utils.imutils import (get_strided_up_size, pre_process_image,
                           process_image_for_cams, rescale_image)
 
@@ -36,6 +40,17 @@ class ImageProcessor:
     gpu : int, optional
         Id of the GPU used to perform the classification and the class
         activation mapping tasks, by default 0.
+    backend : str, optional
+        How the `CAM_PRED` model is prepared for inference: "eager",
+        "compile", "torchscript", "onnx" or "int8", by default the
+        `INFERENCE_BACKEND` environment variable (see
+        `utils.model_backends`). "int8" loads the quantized model written
+        by `calibrate_int8.py` and only runs on CPU; on a GPU the fp32
+        model is used instead.
+    int8_path : str, optional
+        Full path to the quantized `CAM_PRED` model used by the "int8"
+        backend, by default `state_dict_path` with an `.int8.pt`
+        extension (or the `INT8_MODEL_PATH` environment variable).
     """
     """list of str: Names of the intermediate feature pyramid network layers
     (FPN)"""
@@ -57,11 +72,24 @@ class ImageProcessor:
     and the global class activation maps (CAMs) for the image."""
     CAM_PRED_MODEL_CLASS_NAME = "CAM_PRED"
 
+    """dict of {str: tuple of floats}: Named test-time augmentation sets
+    accepted by `execute_cams_pred`. Each scale is always run together with
+    its horizontally flipped copy."""
+    TTA_PRESETS = {
+        "fast": (1.0,),
+        "accurate": (1.0, 0.5, 1.5, 2.0),
+    }
+
     def __init__(self, cats, state_dict_path, model="net.resnet50_cam",
-                 scales=(1.0, 0.5, 1.5, 2.0), gpu=0):
+                 scales=(1.0, 0.5, 1.5, 2.0), gpu=0, backend=None,
+                 int8_path=None):
         self.__cats = cats
+        self.__backend = backend or INFERENCE_BACKEND
+        self.__int8_path = int8_path
         self.__num_cats = len(cats)
         self.__state_dict_path = state_dict_path
+        self.__load_lock = threading.Lock()
+        self.__weights_lock = threading.Lock()
         self.__clear_models()
         self.__model = model
         self.__scales = scales
@@ -208,7 +236,7 @@ class ImageProcessor:
 
         return image_wrapper
 
-    def execute_cams_pred(self, image):
+    def execute_cams_pred(self, image, tta=None):
         """Runs the Neural Network with the loaded weights and biases on the
         target image to get both the Class Activation Maps (CAMs) and the
         classification scores for each category.
@@ -219,6 +247,10 @@ class ImageProcessor:
             The target image on which the computations will be executed. It
             can be both the path were the image file is placed or the
             array-like representation of it.
+        tta : str or tuple of floats, optional
+            Test-time augmentation scales: the name of one of the
+            `TTA_PRESETS` ("fast", "accurate") or the scales themselves,
+            by default the `scales` passed in to the constructor.
 
         Returns
         -------
@@ -226,54 +258,127 @@ class ImageProcessor:
             The image wrapper containing the classification results and the
             computed image CAMs.
         """
-        image = self.__load_image(image)
-        image_wrapper = ImageWrapper(image, self.__cats)
-        # Lazy-loading of the model.
-        if self.__cam_pred_model is None:
-            self.__cam_pred_model =\
-                self.__load_model(self.CAM_PRED_MODEL_CLASS_NAME)
+        return self.execute_cams_pred_batch([image], tta)[0]
 
-        image_size = [
-            torch.tensor([image_wrapper.height]),
-            torch.tensor([image_wrapper.width]),
-        ]
+    def execute_cams_pred_batch(self, images, tta=None):
+        """Batched version of `execute_cams_pred`.
 
-        scaled_images = self.__compute_scaled_images_for_cams(image)
-        scaled_tensors = [torch.from_numpy(si) for si in scaled_images]
+        Images sharing the same size are stacked, together with their
+        flipped copies, into a single tensor so that each scale needs one
+        forward pass for the whole group instead of one per image. This only
+        holds for models returning one CAM per sample; models that fuse the
+        normal + flipped pair themselves still take one forward per image
+        (see `__forward_cam_pred`).
 
-        with torch.no_grad():
-            self.__cam_pred_model.to(self.device).eval() # Force eval mode
+        Only the un-flipped images are copied to the device; the flipped
+        copies are made there. The CAMs of all the scales are upsampled,
+        summed and normalized on the device and the scores reduced there
+        too, so each group crosses back to the host in a single transfer.
+
+        Parameters
+        ----------
+        images : list of str or numpy.ndarray
+            The target images on which the computations will be executed.
+            Each of them can be both the path were the image file is placed
+            or the array-like representation of it.
+        tta : str or tuple of floats, optional
+            Test-time augmentation scales, see `execute_cams_pred`.
+
+        Returns
+        -------
+        list of ImageWrapper
+            One image wrapper per input image, in the same order, containing
+            the classification results and the computed image CAMs.
+        """
+        scales = self.__resolve_tta(tta)
+        images = [self.__load_image(image) for image in images]
+        image_wrappers = [ImageWrapper(image, self.__cats) for image in images]
+        # Lazy-loading of the model.
+        self.__ensure_cam_pred_model()
+
+        # Only images with the same size can be stacked in the same tensor.
+        groups = dict()
+        for idx, image in enumerate(images):
+            groups.setdefault(image.shape[:2], []).append(idx)
+
+        with torch.inference_mode():
             image_labels = torch.from_numpy(np.ones(self.num_cats))
             valid_cat = torch.nonzero(image_labels, as_tuple=True)[0]
-            strided_up_size = get_strided_up_size(image_size, 16)
-            
-            # Explicitly move each fresh tensor to device
-            results = []
-            for t in scaled_tensors:
-                res = self.__cam_pred_model(t.to(self.device))
-                results.append(res)
-                
-            outputs = [a for a, b in results]
-            # Unpack the scores correctly
-            scores = [torch.sigmoid(b).cpu().numpy() for a, b in results]
-            
-            cams = [F.interpolate(torch.unsqueeze(o, 1), strided_up_size,
-                                  mode="bilinear", align_corners=False)
-                    for o in outputs]
-            cams = torch.sum(torch.stack(cams, 0), 0)[:, 0,
-                                                      :image_size[0],
-                                                      :image_size[1]]
-            cams = cams[valid_cat]
-            cams /= F.adaptive_max_pool2d(cams, (1, 1)) + 1e-5
 
-        image_wrapper.global_cams = cams.cpu().data.numpy()
-        # Ensure we are taking the max correctly across the batch and scales
-        # scores[i] is [2, 1] (normal + flipped). We want the max across all.
-        all_flattened_scores = np.concatenate(scores).flatten()
-        max_score = float(np.max(all_flattened_scores))
-        
-        image_wrapper.classification_scores = [max_score]
-        return image_wrapper
+            for (height, width), indices in groups.items():
+                image_size = [torch.tensor([height]), torch.tensor([width])]
+                strided_up_size = get_strided_up_size(image_size, 16)
+
+                cams = None
+                scores = None
+                for scale in scales:
+                    # (N, C, H, W) tensor for the N images of the group,
+                    # interleaved on the device with the flipped copies
+                    # into (2 * N, C, H, W): normal at 2i, flipped at 2i + 1.
+                    batch = self.__scaled_batch(
+                        [images[i] for i in indices], scale).to(self.device)
+                    batch = torch.stack((batch, batch.flip(-1)), dim=1)\
+                        .flatten(0, 1)
+                    outputs, logits = self.__forward_cam_pred(
+                        batch, len(indices))
+
+                    scale_cams = F.interpolate(
+                        outputs, strided_up_size, mode="bilinear",
+                        align_corners=False)
+                    cams = scale_cams if cams is None else cams + scale_cams
+
+                    # Max across the normal and flipped images and the
+                    # categories of each image.
+                    scale_scores = torch.sigmoid(logits).amax(dim=1)
+                    scores = scale_scores if scores is None\
+                        else torch.maximum(scores, scale_scores)
+
+                cams = cams[:, :, :height, :width][:, valid_cat]
+                cams /= F.adaptive_max_pool2d(cams, (1, 1)) + 1e-5
+
+                # Packing the scores after the flattened CAMs of each image
+                # makes the device to host copy (and sync) happen once.
+                packed = torch.cat(
+                    (cams.flatten(1), scores.unsqueeze(1).to(cams.dtype)),
+                    dim=1).cpu().numpy()
+                cams_np = packed[:, :-1].reshape(cams.shape)
+                for i, idx in enumerate(indices):
+                    image_wrappers[idx].global_cams = cams_np[i]
+                    image_wrappers[idx].classification_scores =\
+                        [float(packed[i, -1])]
+
+        return image_wrappers
+
+    def load(self):
+        """Loads and prepares the `CAM_PRED` model without running it.
+
+        Used to load the weights in a parent process before forking
+        workers, which then share them (see `serve.py`); a forward pass
+        would start thread pools that do not survive a fork.
+        """
+        self.__ensure_cam_pred_model()
+
+    def warmup(self, image_size=(800, 800)):
+        """Loads the `CAM_PRED` model and runs a dummy forward pass at the
+        given resolution, so that the first real request pays neither for
+        the checkpoint loading nor for the allocator and kernel warmup.
+
+        Parameters
+        ----------
+        image_size : tuple of int, optional
+            Size (height, width) of the dummy image, by default (800, 800).
+
+        Returns
+        -------
+        dict of {str: float}
+            Seconds spent loading the model (`load`) and running the dummy
+            forward pass (`warmup`).
+        """
+        start = time.perf_counter()
+        self.__ensure_cam_pred_model()
+        loaded = time.perf_counter()
+        self.execute_cams_pred(np.zeros((*image_size, 3), dtype=np.uint8))
+        return {"load": loaded - start, "warmup": time.perf_counter() - loaded}
 
     def get_model(self):
         if self.__classification_model is None:
@@ -424,13 +529,21 @@ class ImageProcessor:
             ID of the target GPU.
         """
         self.device = torch.device(f"cuda:{gpu_id}" if torch.cuda.is_available() else "cpu")
+        # Prepared once per device, so it is prepared again on next use.
+        self.__cam_pred_model = None
 
     def __clear_models(self):
         """Clears out all the models loaded so far."""
         self.__cam_model = None
         self.__cam_pred_model = None
+        # Unknown until the first forward: whether `CAM_PRED` fuses the
+        # normal + flipped pair itself or returns one CAM per sample.
+        self.__cam_pred_fuses_pairs = None
         self.__cam_scales_model = None
         self.__classification_model = None
+        # State dict shared by all the models above, and its device.
+        self.__weights = None
+        self.__weights_device = None
 
     def __compute_scaled_images_for_cams(self, image):
         """Generates all rescaled images of the original image starting from
@@ -448,6 +561,101 @@ class ImageProcessor:
 
         return scaled_images
 
+    def __resolve_tta(self, tta):
+        """Returns the scales of a `TTA_PRESETS` name, of an explicit tuple
+        of scales or, when `tta` is None, the constructor scales."""
+        if tta is None:
+            return self.scales
+        if isinstance(tta, str):
+            if tta not in self.TTA_PRESETS:
+                raise ValueError(
+                    f"Unknown TTA preset {tta!r}; expected one of "
+                    f"{', '.join(self.TTA_PRESETS)}")
+            return self.TTA_PRESETS[tta]
+        return tuple(tta)
+
+    def __scaled_batch(self, images, scale):
+        """Rescales and pre-processes same-size images into a single
+        (N, C, H, W) tensor, without the flipped copies."""
+        scaled_images = [
+            image if scale == 1 else rescale_image(image, scale, order=3)
+            for image in images]
+        return torch.from_numpy(np.stack(
+            [pre_process_image(si) for si in scaled_images]))
+
+    def __ensure_cam_pred_model(self):
+        """Loads and prepares the `CAM_PRED` model once (device, eval mode,
+        memory format and backend), even when several inference threads ask
+        for it at the same time."""
+        if self.__cam_pred_model is None:
+            with self.__load_lock:
+                if self.__cam_pred_model is None:
+                    backend = self.__backend
+                    if backend == "int8" and self.device.type != "cpu":
+                        print(f"int8 backend is CPU only; using fp32 on "
+                              f"{self.device}")
+                        backend = "eager"
+                    if backend == "int8":
+                        model = load_int8(self.__int8_path or default_int8_path(
+                            self.state_dict_path))
+                    else:
+                        model = self.__load_model(
+                            self.CAM_PRED_MODEL_CLASS_NAME)
+                    self.__cam_pred_model = PreparedModel(
+                        model, self.device, backend)
+
+    def __forward_cam_pred(self, batch, num_images):
+        """Runs the `CAM_PRED` model on a batch of normal + flipped image
+        pairs.
+
+        Models that return one CAM per input sample get their pairs fused
+        here, and the whole batch takes a single forward. Models that fuse
+        the pair internally (returning a single 3-d CAM, as the in-tree
+        `CAM` contract does) only see the first pair of a batch, so each
+        pair is forwarded separately: for them batching saves nothing but
+        the Python overhead between forwards.
+
+        The kind of model is probed on the first call by forwarding the
+        first pair alone; its result is kept, so no forward is wasted. The
+        warm-up forward (one image) settles it before any real request.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Tensor with shape (2 * num_images, C, H, W) where the image at
+            index 2i + 1 is the flipped copy of the image at index 2i.
+        num_images : int
+            Number of original images in the batch.
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            The CAMs with shape (num_images, num_cats, h, w) and the logits
+            with shape (num_images, 2 * num_cats).
+        """
+        if num_images > 1 and self.__cam_pred_fuses_pairs is None:
+            first_outputs, first_logits = self.__forward_cam_pred(batch[:2], 1)
+            outputs, logits = self.__forward_cam_pred(batch[2:], num_images - 1)
+            return (torch.cat((first_outputs, outputs)),
+                    torch.cat((first_logits, logits)))
+
+        if num_images > 1 and self.__cam_pred_fuses_pairs:
+            results = [self.__cam_pred_model(pair)
+                       for pair in torch.split(batch, 2)]
+            outputs = torch.stack([o for o, _ in results])
+            logits = torch.cat([lg for _, lg in results])
+            return outputs, logits.reshape(num_images, -1)
+
+        outputs, logits = self.__cam_pred_model(batch)
+        if num_images == 1:
+            self.__cam_pred_fuses_pairs = outputs.dim() == 3
+        if self.__cam_pred_fuses_pairs:
+            outputs = outputs.unsqueeze(0)
+        else:
+            outputs = outputs[0::2] + outputs[1::2].flip(-1)
+
+        return outputs, logits.reshape(num_images, -1)
+
     def __load_model(self, class_name):
         """Loads the Neural Network model with the weights and biases
         specified in the `.pth` file located at `state_dict_path`.
@@ -465,11 +673,31 @@ class ImageProcessor:
 
         model_class = getattr(import_module(self.__model), class_name)
         model = model_class(self.num_cats, pretrained=False)
-        model.load_state_dict(torch.load(self.state_dict_path, map_location=self.device), strict=True)
+        # With `assign=True` the model's parameters and buffers become the
+        # shared state dict tensors instead of copies of them, so the
+        # `Net`, `CAM`, `CAM_SCALES` and `CAM_PRED` models hold one set of
+        # weights between them.
+        model.load_state_dict(self.__load_weights(), strict=True, assign=True)
 
         model.eval()
         return model
 
+    def __load_weights(self):
+        """Loads the checkpoint at `state_dict_path` once per device,
+        memory-mapped when it is on the CPU.
+
+        Returns
+        -------
+        dict of {str: torch.Tensor}
+            The state dict shared by all the models of this instance.
+        """
+        with self.__weights_lock:
+            if self.__weights is None or self.__weights_device != self.device:
+                self.__weights = load_weights(self.state_dict_path,
+                                              self.device)
+                self.__weights_device = self.device
+            return self.__weights
+
     def __load_image(self, image_src):
         """Load the image from the given source.
 
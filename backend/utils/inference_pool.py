@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class InferenceQueueFull(RuntimeError):
+    """Raised when the inference pool cannot accept more work"""
+
+
+class InferencePool:
+    """Bounded worker pool that runs model inference off the event loop.
+
+    Torch, OpenCV and NumPy release the GIL during their heavy kernels, so a
+    thread pool lets several forwards overlap while uvicorn keeps serving
+    light requests. Admission is bounded: once ``max_workers + max_queue``
+    jobs are in flight, ``submit`` fails fast with ``InferenceQueueFull``
+    instead of letting latency grow without limit.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        if max_workers is None:
+            # Two torch intra-op threads per worker (see configure_torch_threads):
+            # a lone request still gets two cores instead of one
+            max_workers = int(os.getenv("INFERENCE_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+        if max_queue is None:
+            max_queue = int(os.getenv("INFERENCE_MAX_QUEUE", max_workers * 4))
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def submit(self, fn: Callable, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on a worker thread and await its result"""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise InferenceQueueFull(
+                    f"Inference queue is full ({self._in_flight} jobs in flight)")
+            self._in_flight += 1
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        # Release the slot when the job really finishes, not when the caller
+        # stops waiting: a cancelled request still occupies its worker.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Uploads whose header declares more pixels than this are refused before
+# any pixel data is decoded (a 108 MP phone sensor is ~108_000_000)
+MAX_IMAGE_PIXELS = int(os.getenv("INGEST_MAX_PIXELS", 120_000_000))
+ACCEPTED_FORMATS = ("JPEG", "PNG", "WEBP", "TIFF", "BMP", "MPO")
+
+# Per-file upload limit, shared with FileHandler
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_FILE_SIZE", 10485760))  # 10MB
+# Uploads up to this size are read into memory; larger ones stay in
+# Starlette's on-disk spool and are decoded from there
+UPLOAD_MEMORY_BYTES = int(os.getenv("UPLOAD_MEMORY_BYTES", 1048576))  # 1MB
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# 16-bit and float images (e.g. single-band GeoTIFFs) are stretched to 8 bits
+# between these percentiles of their values, estimated on this many samples
+HIGH_DEPTH_MODES = ("I;16", "I;16L", "I;16B", "I;16N", "I", "F")
+STRETCH_PERCENTILES = (0.5, 99.5)
+STRETCH_SAMPLES = 1_000_000
+
+
+class UnsupportedImage(ValueError):
+    """The payload is not an image in one of ACCEPTED_FORMATS"""
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more than MAX_IMAGE_PIXELS pixels"""
+
+
+class UploadTooLarge(ValueError):
+    """The upload is larger than MAX_UPLOAD_BYTES"""
+
+
+class Upload:
+    """
+    A size-checked upload: `source` is either the bytes of a small upload or
+    the seekable spool file of a large one, and `digest` is the raw SHA-256
+    of its content (the result-cache key material).
+    """
+
+    def __init__(self, source, size, digest):
+        self.source = source
+        self.size = size
+        self.digest = digest
+
+    def __len__(self):
+        return self.size
+
+
+async def read_upload(upload_file, max_bytes=None):
+    """
+    Streams an UploadFile in chunks, hashing it and enforcing `max_bytes`
+    (MAX_UPLOAD_BYTES by default) without holding a copy of the body.
+    Raises UploadTooLarge as soon as the limit is crossed.
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise UploadTooLarge(f"Upload is {upload_file.size} bytes; the limit is {max_bytes}")
+
+    await upload_file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        digest.update(chunk)
+
+    await upload_file.seek(0)
+    if size <= UPLOAD_MEMORY_BYTES:
+        source = await upload_file.read()
+    else:
+        source = upload_file.file
+    return Upload(source, size, digest.digest())
+
+
+class UploadLimitMiddleware:
+    """
+    Refuses requests to the given paths whose Content-Length exceeds the
+    path's limit with 413, before the multipart body is read or spooled.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.limits:
+            limit = self.limits[scope["path"]]
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > limit:
+                body = json.dumps({"success": False,
+                                   "error": f"Request body exceeds the {limit} byte limit"}).encode("utf-8")
+                await send({"type": "http.response.start", "status": 413,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(body)).encode("ascii"))]})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+
+def open_image(data, max_pixels=None):
+    """
+    Opens an encoded image lazily and validates its header: only the format
+    and dimensions are read, no pixel data is decoded yet. `data` is bytes,
+    an Upload, a path or a seekable binary file.
+    Raises UnsupportedImage or ImageTooLarge.
+    """
+    max_pixels = max_pixels or MAX_IMAGE_PIXELS
+    if isinstance(data, Upload):
+        data = data.source
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(data)
+    elif hasattr(data, "seek"):
+        data.seek(0)
+    try:
+        image = Image.open(data)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise UnsupportedImage("Upload is not a readable image") from e
+    if image.format not in ACCEPTED_FORMATS:
+        raise UnsupportedImage(f"Unsupported image format: {image.format}")
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height}; at most {max_pixels} pixels are accepted")
+    return image
+
+
+def probe_image(data, max_pixels=None):
+    """Returns the (format, (width, height)) of an encoded image"""
+    with open_image(data, max_pixels) as image:
+        return image.format, image.size
+
+
+def decode_image(data, min_size=None, max_pixels=None):
+    """
+    Decodes an encoded image to an RGB PIL image.
+
+    With `min_size` (width, height), JPEGs are decoded with reduced-DCT
+    scaling (1/2, 1/4 or 1/8) to the smallest size that still covers it,
+    which skips most of the IDCT work and memory of a full decode.
+    """
+    image = open_image(data, max_pixels)
+    if min_size is not None and image.format in ("JPEG", "MPO"):
+        image.draft("RGB", tuple(min_size))
+    return to_rgb(image)
+
+
+def to_rgb(image):
+    """
+    Converts a PIL image to RGB. 16-bit and float images are first
+    stretched to 0-255 between the STRETCH_PERCENTILES of their values:
+    `convert` would clip them instead, turning a 16-bit GeoTIFF white.
+    """
+    if image.mode == "RGB":
+        return image
+    if image.mode not in HIGH_DEPTH_MODES:
+        return image.convert("RGB")
+
+    values = np.asarray(image)
+    step = max(1, int(np.sqrt(values.size / STRETCH_SAMPLES)))
+    sample = values[::step, ::step].astype(np.float32)
+    low, high = np.percentile(sample[np.isfinite(sample)], STRETCH_PERCENTILES) \
+        if np.isfinite(sample).any() else (0.0, 0.0)
+    scale = 255.0 / (high - low) if high > low else 0.0
+    stretched = np.empty(values.shape, dtype=np.uint8)
+    # Row blocks keep the float copy small for large mosaics
+    rows = max(1, STRETCH_SAMPLES // max(1, values.shape[1]))
+    for y in range(0, values.shape[0], rows):
+        block = (values[y:y + rows].astype(np.float32) - low) * scale
+        np.clip(np.nan_to_num(block), 0, 255, out=block)
+        stretched[y:y + rows] = block
+    return Image.fromarray(stretched, "L").convert("RGB")
+
+
+def load_rgb_array(data, size, max_pixels=None):
+    """Decodes an encoded image straight to a size[0] x size[1] RGB array"""
+    image = decode_image(data, min_size=size, max_pixels=max_pixels)
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), Image.BILINEAR)
+    return np.array(image)
@@ -0,0 +1,200 @@
+import os
+import threading
+
+import numpy as np
+import cv2
+
+# Logistic midpoints used to calibrate the raw fused score per capture mode
+SAT_MIDPOINT = 0.60
+GROUND_MIDPOINT = 0.22
+
+# Image pyramid level the texture stage runs at: 0 is full resolution and
+# every level halves each side. The midpoints above are calibrated at 0.
+TEXTURE_PYRAMID_LEVEL = int(os.getenv("TEXTURE_PYRAMID_LEVEL", 0))
+
+def compute_chaos_index(image_np, level=None):
+    """
+    Laplacian "chaos" index of an RGB image.
+    Returns the index in [0, 1] and the absolute Laplacian texture map, at
+    the resolution of pyramid `level` (TEXTURE_PYRAMID_LEVEL by default).
+    """
+    if level is None:
+        level = TEXTURE_PYRAMID_LEVEL
+    gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+    for _ in range(level):
+        gray = cv2.pyrDown(gray)
+    mag = cv2.Laplacian(gray, cv2.CV_32F, ksize=3)
+    np.abs(mag, out=mag)
+
+    # Mean and standard deviation in a single pass
+    mean, std = cv2.meanStdDev(mag)
+    raw_chaos = float(std[0, 0] / (mean[0, 0] + 1.5))
+    chaos_idx = min(1.0, raw_chaos * 2.2)
+    return chaos_idx, mag
+
+def fuse_sat_score(resnet_score, chaos_idx):
+    return (resnet_score * 0.6) + (chaos_idx * 0.4)
+
+def fuse_ground_score(yolo_score, chaos_idx):
+    return (max(yolo_score, chaos_idx * 0.85) * 0.75) + (chaos_idx * 0.45)
+
+def calibrate_score(score, x0):
+    final_score = 1 / (1 + np.exp(-16 * (score - x0)))
+    return float(max(0.01, min(final_score, 0.99)))
+
+def classify_landfill_score(final_score):
+    """Maps a calibrated score to its (status, status_type) labels."""
+    if final_score > 0.65:
+        return "Illegal Dumping", "danger"
+    if final_score > 0.30:
+        return "Suspicious Site", "warning"
+    return "Safe", "success"
+
+
+# Per-thread scratch buffers of generate_heatmap, keyed by name and shape
+_heatmap_buffers = threading.local()
+
+# JET colormap in RGB channel order, so the colorized map needs no BGR swap
+_JET_RGB = cv2.cvtColor(cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1),
+                                          cv2.COLORMAP_JET), cv2.COLOR_BGR2RGB)
+
+# Land mode smooths the CAM and the fused map at 1/LAND_BLUR_FACTOR of the
+# output resolution; dilation and Gaussian sizes below are full-resolution
+LAND_BLUR_FACTOR = 4
+LAND_CAM_DILATE = 89        # two 45x45 dilations == one 89x89 dilation
+LAND_CAM_SIGMA = 8.0        # sigma OpenCV derives for a 51x51 kernel
+LAND_FUSION_SIGMA = 5.0     # sigma OpenCV derives for a 31x31 kernel
+TEXTURE_SIGMA = 2.6         # sigma OpenCV derives for a 15x15 kernel
+TEXTURE_CLOSE = 21
+
+
+def _buffer(name, shape, dtype=np.float32):
+    """Returns this thread's `name` scratch array of `shape`, allocating it once"""
+    buffers = getattr(_heatmap_buffers, "arrays", None)
+    if buffers is None:
+        buffers = _heatmap_buffers.arrays = {}
+    arr = buffers.get((name, shape))
+    if arr is None:
+        arr = buffers[(name, shape)] = np.empty(shape, dtype)
+    return arr
+
+
+def _odd(size):
+    return max(1, int(size)) | 1
+
+
+def _fit(src, h, w, dst):
+    """Copies `src` into `dst`, resizing it first when its shape differs"""
+    if src.shape[:2] == (h, w):
+        np.copyto(dst, src, casting="unsafe")
+    else:
+        cv2.resize(src.astype(np.float32, copy=False), (w, h), dst=dst, interpolation=cv2.INTER_LINEAR)
+    return dst
+
+
+def _smooth_downsampled(src, h, w, dst, sigma, dilate=0):
+    """
+    Optional rectangular dilation followed by a Gaussian blur, both run at
+    1/LAND_BLUR_FACTOR resolution and upsampled into `dst` (h x w).
+    """
+    f = LAND_BLUR_FACTOR
+    small = cv2.resize(src, (max(1, w // f), max(1, h // f)), interpolation=cv2.INTER_AREA)
+    if dilate:
+        k = max(1, dilate // f) | 1
+        small = cv2.dilate(small, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    small = cv2.GaussianBlur(small, (0, 0), sigma / f)
+    return cv2.resize(small, (w, h), dst=dst, interpolation=cv2.INTER_LINEAR)
+
+
+def _normalize_max(arr):
+    """Scales `arr` in place so its maximum is 1 (left untouched when max <= 0)"""
+    a_max = cv2.minMaxLoc(arr)[1]
+    if a_max > 0:
+        cv2.multiply(arr, 1.0 / (a_max + 1e-7), dst=arr)
+    return arr
+
+
+def generate_heatmap(original_image_np, cam_array, texture_map, mode="sat"):
+    """
+    Surgical Neural Fusion with Texture-Aware Clustering.
+
+    Parameters
+    ----------
+    original_image_np : np.ndarray
+        H x W x 3 uint8 RGB image the heatmap is blended onto.
+    cam_array : np.ndarray
+        Class activation map (any size; resized to H x W).
+    texture_map : np.ndarray
+        Laplacian magnitude map from `compute_chaos_index`. It is clustered
+        at its own resolution, with kernels scaled to match, so a map from
+        a coarser pyramid level is only upsampled once it is a mask.
+    mode : str
+        "sat" for aerial CAMs, "land" for ground detection boxes, which are
+        grown and smoothed into blobs first.
+
+    Returns
+    -------
+    overlay : np.ndarray
+        H x W x 3 uint8 RGB overlay.
+    fusion : np.ndarray
+        H x W float32 fused intensity in [0, 1].
+
+    Notes
+    -----
+    Both arrays are per-thread scratch buffers reused by the next call on the
+    same thread; copy them if they must outlive that. Large land-mode blurs
+    run downsampled, so output matches the full-resolution reference within
+    the tolerance checked by `benchmarks/heatmap_bench.py`.
+    """
+    h, w = original_image_np.shape[:2]
+
+    if mode == "land":
+        cam = _smooth_downsampled(np.asarray(cam_array, dtype=np.float32), h, w, _buffer("cam", (h, w)),
+                                  LAND_CAM_SIGMA, dilate=LAND_CAM_DILATE)
+    else:
+        cam = _fit(cam_array, h, w, _buffer("cam", (h, w)))
+    _normalize_max(cam)
+
+    tex_shape = texture_map.shape[:2]
+    scale = tex_shape[1] / w
+    texture = _buffer("texture", tex_shape)
+    np.copyto(texture, texture_map, casting="unsafe")
+    blur = _odd(15 * scale)
+    cv2.GaussianBlur(texture, (blur, blur), TEXTURE_SIGMA * scale, dst=texture)
+    tex_mask = _buffer("tex_mask", tex_shape, np.uint8)
+    cv2.compare(texture, float(cv2.mean(texture)[0]) * 1.5, cv2.CMP_GT, dst=tex_mask)
+    close = _odd(TEXTURE_CLOSE * scale)
+    tex_closed = cv2.morphologyEx(tex_mask, cv2.MORPH_CLOSE,
+                                  cv2.getStructuringElement(cv2.MORPH_RECT, (close, close)),
+                                  dst=_buffer("tex_closed", tex_shape, np.uint8))
+    if tex_shape != (h, w):
+        tex_closed = cv2.resize(tex_closed, (w, h), dst=_buffer("tex_full", (h, w), np.uint8),
+                                interpolation=cv2.INTER_LINEAR)
+
+    fusion = _buffer("fusion", (h, w))
+    if mode == "land":
+        # 0.5 * cam + 0.5 * tex, with tex the 0/255 mask scaled to [0, 1]
+        cv2.addWeighted(cam, 0.5, tex_closed, 0.5 / 255, 0, dst=fusion, dtype=cv2.CV_32F)
+        _smooth_downsampled(fusion, h, w, fusion, LAND_FUSION_SIGMA)
+    else:
+        # cam * 0.8 + cam * tex * 0.2 == cam * (0.8 + 0.2 * tex)
+        weights = _buffer("weights", (h, w))
+        cv2.multiply(tex_closed, 0.2 / 255, dst=weights, dtype=cv2.CV_32F)
+        cv2.add(weights, 0.8, dst=weights)
+        cv2.multiply(cam, weights, dst=fusion)
+
+    cv2.patchNaNs(fusion, 0)
+    np.clip(fusion, 0, 1, out=fusion)
+    np.power(fusion, 1.1, out=fusion)
+    cv2.threshold(fusion, 0.2, 0, cv2.THRESH_TOZERO, dst=fusion)
+
+    levels = _buffer("levels", (h, w), np.uint8)
+    cv2.convertScaleAbs(fusion, dst=levels, alpha=255)
+    color = cv2.applyColorMap(levels, _JET_RGB, dst=_buffer("color", (h, w, 3), np.uint8))
+
+    # overlay = image * (1 - 0.75 m) + color * 0.75 m, without a 3-channel mask
+    weights, inverse = _buffer("weights", (h, w)), _buffer("inverse", (h, w))
+    cv2.multiply(fusion, 0.75, dst=weights)
+    cv2.subtract(1.0, weights, dst=inverse)
+    overlay = cv2.blendLinear(original_image_np, color, inverse, weights, dst=_buffer("overlay", (h, w, 3), np.uint8))
+    return overlay, fusion
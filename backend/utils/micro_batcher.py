@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from utils.inference_pool import InferencePool, InferenceQueueFull
+
+
+class MicroBatcher:
+    """Groups concurrent single-item requests into one batched model call.
+
+    The first queued item opens a collection window of ``max_wait_ms``; the
+    batch is dispatched as soon as the window closes or ``max_batch_size``
+    items have arrived. ``batch_fn`` receives a list of items and must return
+    a list of results in the same order; it runs on the inference pool so
+    the event loop is never blocked.
+    """
+
+    def __init__(self, batch_fn: Callable, pool: InferencePool,
+                 max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None,
+                 max_pending: Optional[int] = None):
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("GROUND_BATCH_SIZE", 8))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("GROUND_BATCH_WINDOW_MS", 15))
+        self.batch_fn = batch_fn
+        self.pool = pool
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_pending = max_pending or pool.capacity * self.max_batch_size
+        self._queue = None
+        self._worker = None
+        self._in_progress = set()
+        self._pending = 0
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def submit(self, item):
+        """Queue ``item`` for the next batch and await its own result"""
+        if self._pending >= self.max_pending:
+            raise InferenceQueueFull(
+                f"Batching queue is full ({self._pending} items pending)")
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.max_wait * 1000.0,
+            "pending": self._pending,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "avg_queue_wait_ms": round(self._wait_total / self._items * 1000.0, 3) if self._items else 0.0,
+            "max_queue_wait_ms": round(self._wait_max * 1000.0, 3),
+        }
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._collect())
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without waiting so the next window can fill while
+            # this batch is running on the pool.
+            task = loop.create_task(self._dispatch(batch))
+            self._in_progress.add(task)
+            task.add_done_callback(self._in_progress.discard)
+
+    async def _dispatch(self, batch):
+        dispatched_at = time.perf_counter()
+        self._pending -= len(batch)
+        self._batches += 1
+        self._items += len(batch)
+        self._batch_sizes[len(batch)] += 1
+        for _, _, queued_at in batch:
+            wait = dispatched_at - queued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            results = await self.pool.submit(self.batch_fn, [item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
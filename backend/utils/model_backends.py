@@ -0,0 +1,203 @@
+import os
+import pickle
+import tempfile
+import threading
+
+import numpy as np
+import torch
+
+# How CAM models are prepared for inference: "eager", "compile"
+# (torch.compile), "torchscript" (trace + freeze), "onnx" (ONNX Runtime,
+# CPU only, needs the onnxruntime package) or "int8" (statically quantized
+# model produced by calibrate_int8.py, CPU only)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+BACKENDS = ("eager", "compile", "torchscript", "onnx", "int8")
+# x86 (fbgemm) kernels; "qnnpack" on ARM nodes
+QUANTIZED_ENGINE = os.getenv("QUANTIZED_ENGINE", "x86")
+# Convolutions in NHWC layout: "1", "0", or unset for GPUs only. On the CPU
+# it copies the convolution weights out of the memory-mapped checkpoint, so
+# worker processes would no longer share them
+CHANNELS_LAST = {"1": True, "0": False}.get(os.getenv("CHANNELS_LAST", ""))
+
+_threads_lock = threading.Lock()
+_threads_configured = None
+
+
+def configure_torch_threads(workers, num_threads=None):
+    """
+    Sizes torch's intra-op thread pool so that `workers` concurrent
+    forwards do not oversubscribe the CPU: cpus // workers threads each
+    (TORCH_THREADS overrides). The pool is process-wide, so this is done
+    once, before the first forward. Returns the thread count in use.
+    """
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured is None:
+            if num_threads is None:
+                num_threads = int(os.getenv("TORCH_THREADS", 0)) or \
+                    max(1, (os.cpu_count() or 1) // max(1, workers))
+            torch.set_num_threads(num_threads)
+            _threads_configured = num_threads
+        return _threads_configured
+
+
+def load_weights(path, device="cpu"):
+    """
+    Loads a checkpoint's state dict with its tensors memory-mapped from the
+    file (torch >= 2.1, zipfile checkpoints), so the weights live in the
+    page cache and worker processes loading the same file share them.
+    Falls back to a regular load for legacy checkpoints and for ones
+    `weights_only` rejects (pickled non-tensor objects). Tensors are moved
+    to `device` when it is not the CPU.
+    """
+    try:
+        state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except (RuntimeError, TypeError, ValueError, pickle.UnpicklingError) as e:
+        print(f"Checkpoint {path} cannot be memory-mapped ({e}); loading it into memory")
+        state_dict = torch.load(path, map_location="cpu")
+    device = torch.device(device)
+    if device.type != "cpu":
+        state_dict = {name: tensor.to(device) for name, tensor in state_dict.items()}
+    return state_dict
+
+
+class PreparedModel:
+    """
+    A CAM model prepared once for inference: moved to its device, in eval
+    mode, optionally channels_last, and compiled by `backend`. Called like
+    the model; inputs are converted to the model's memory format here.
+    """
+
+    def __init__(self, model, device, backend=None, example=None, channels_last=None):
+        backend = backend or INFERENCE_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+        self.device = torch.device(device)
+        if channels_last is None:
+            channels_last = CHANNELS_LAST if CHANNELS_LAST is not None else self.device.type == "cuda"
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
+        if backend == "int8":
+            # Already a frozen, quantized TorchScript module (see load_int8)
+            if self.device.type != "cpu":
+                raise ValueError(f"The int8 backend runs on CPU only, not {self.device}")
+            self.backend = backend
+            self._model = self._runner = model
+            return
+
+        model = model.to(self.device).eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+        # Converting to channels_last copies the convolution weights, so the
+        # model no longer shares them with the checkpoint's mapped pages
+        model = model.to(memory_format=self.memory_format)
+
+        if backend == "onnx" and self.device.type != "cpu":
+            print(f"ONNX Runtime backend is CPU only; using eager on {self.device}")
+            backend = "eager"
+        if backend == "onnx":
+            try:
+                import onnxruntime  # noqa: F401
+            except ImportError:
+                print("onnxruntime is not installed; using the eager backend")
+                backend = "eager"
+        self.backend = backend
+        self._model = model
+        self._runner = None
+        self._example = example
+        self._build_lock = threading.Lock()
+
+    def __call__(self, batch):
+        if self._runner is None:
+            with self._build_lock:
+                if self._runner is None:
+                    # Tracing and exporting need a real input; the first batch is one
+                    self._runner = self._build(batch if self._example is None else self._example)
+        if self.backend == "onnx":
+            return self._runner(batch)
+        return self._runner(batch.to(self.device, memory_format=self.memory_format))
+
+    def _build(self, example):
+        if self.backend == "compile":
+            # Input sizes vary with the image size and TTA scale
+            return torch.compile(self._model, dynamic=True)
+        if self.backend == "eager":
+            return self._model
+        # Tracing cannot record inference-mode tensors; trace on a normal copy
+        with torch.inference_mode(False), torch.no_grad():
+            example = example.to(self.device, memory_format=self.memory_format).clone()
+            if self.backend == "torchscript":
+                return torch.jit.freeze(torch.jit.trace(self._model, example, strict=False))
+            return _OnnxRunner(self._model, example)
+
+
+class _OnnxRunner:
+    """Exports a model to ONNX once and runs it with ONNX Runtime on CPU"""
+
+    def __init__(self, model, example):
+        import onnxruntime
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "model.onnx")
+            outputs = model(example)
+            output_names = [f"output_{i}" for i in range(len(outputs))] \
+                if isinstance(outputs, (tuple, list)) else ["output_0"]
+            torch.onnx.export(
+                model, (example,), path, input_names=["input"], output_names=output_names,
+                dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}},
+                opset_version=17)
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            self._session = onnxruntime.InferenceSession(
+                path, options, providers=["CPUExecutionProvider"])
+        self._tuple_output = len(output_names) > 1
+
+    def __call__(self, batch):
+        inputs = {"input": np.ascontiguousarray(batch.cpu().numpy())}
+        outputs = [torch.from_numpy(o) for o in self._session.run(None, inputs)]
+        return tuple(outputs) if self._tuple_output else outputs[0]
+
+
+def default_int8_path(state_dict_path):
+    """Where calibrate_int8.py stores the quantized twin of a checkpoint"""
+    return os.getenv("INT8_MODEL_PATH") or os.path.splitext(state_dict_path)[0] + ".int8.pt"
+
+
+def quantize_int8(model, calibration_batches, engine=None):
+    """
+    Post-training static int8 quantization (FX graph mode) of an fp32 model.
+
+    Convolutions, their batch norms and ReLUs are fused and quantized per
+    channel; activation ranges are observed over `calibration_batches`
+    (input tensors laid out like the production batches). The model has
+    to be symbolically traceable by torch.fx. Returns the converted model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = engine or QUANTIZED_ENGINE
+    torch.backends.quantized.engine = engine
+    model = model.cpu().eval()
+    batches = iter(calibration_batches)
+    first = next(batches)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (first,))
+    with torch.no_grad():
+        prepared(first)
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def save_int8(quantized, example, path):
+    """Traces a quantized model to TorchScript so it loads without its Python module"""
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, example, strict=False)
+    torch.jit.save(traced, path)
+
+
+def load_int8(path, engine=None):
+    """Loads a model saved by `save_int8`, frozen for inference"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No int8 model at {path}; create it with calibrate_int8.py")
+    torch.backends.quantized.engine = engine or QUANTIZED_ENGINE
+    return torch.jit.freeze(torch.jit.load(path, map_location="cpu").eval())
@@ -0,0 +1,179 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from utils.ingest import Upload, decode_image, probe_image
+
+class ReportMediaBusy(RuntimeError):
+    """Raised when too many report images are already waiting to be written"""
+
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "MPO": "jpg", "PNG": "png", "WEBP": "webp", "TIFF": "tif", "BMP": "bmp"}
+
+
+class ReportMediaWriter:
+    """Persists report images off the request path.
+
+    The upload's original encoded bytes are stored as-is (no re-encode)
+    under a collision-free name, and a small JPEG thumbnail for the
+    dashboard is rendered from them afterwards. Both run on background
+    threads; the public URLs are known up front, so the report row can be
+    inserted right away. Files are written to a temporary name and renamed,
+    so a URL never serves a partial file.
+
+    At most `max_pending` uploads wait to be written (each may hold its
+    bytes in memory); beyond that `save` fails fast with ReportMediaBusy,
+    like InferencePool. Files of a report deleted before its writes finish
+    are removed as soon as they land (see `discard`).
+    """
+
+    def __init__(self, media_dir: str, url_prefix: str, thumb_size: Optional[int] = None,
+                 workers: Optional[int] = None, max_pending: Optional[int] = None):
+        if thumb_size is None:
+            thumb_size = int(os.getenv("REPORT_THUMB_SIZE", 256))
+        if workers is None:
+            workers = int(os.getenv("REPORT_WRITER_WORKERS", 2))
+        if max_pending is None:
+            max_pending = int(os.getenv("REPORT_WRITER_MAX_PENDING", 64))
+        self.media_dir = media_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.thumb_size = thumb_size
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report-media")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._written = 0
+        self._failed = 0
+        self._rejected = 0
+        # Paths still to be written, and those of them whose report is gone
+        self._scheduled = set()
+        self._discarded = set()
+        os.makedirs(self.media_dir, exist_ok=True)
+
+    async def save(self, upload: Upload, prefix: str) -> tuple:
+        """
+        Schedules an upload for persistence and returns the (image_url,
+        thumb_url) it will be served at.
+
+        Small uploads are handed over in memory. An upload that is still in
+        Starlette's spool file is copied to its final place first (a raw
+        copy, no decoding), because the spool is deleted once the request
+        ends; its thumbnail is still rendered in the background.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ReportMediaBusy(f"Report image writer is busy ({self._pending} images queued)")
+            self._pending += 1
+        try:
+            image_format, _ = await run_in_threadpool(probe_image, upload)
+        except BaseException:
+            self._finish(False, ())
+            raise
+        name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+        image_name = f"{name}.{FORMAT_EXTENSIONS.get(image_format, 'img')}"
+        thumb_name = f"{name}_thumb.jpg"
+        image_path = os.path.join(self.media_dir, image_name)
+        thumb_path = os.path.join(self.media_dir, thumb_name)
+
+        paths = (image_path, thumb_path)
+        with self._lock:
+            self._scheduled.update(paths)
+        if isinstance(upload.source, bytes):
+            future = self._executor.submit(self._persist, upload.source, image_path, thumb_path)
+        else:
+            try:
+                await run_in_threadpool(self._write_atomic, image_path, upload.source)
+            except BaseException:
+                self._finish(False, paths)
+                raise
+            future = self._executor.submit(self._persist, None, image_path, thumb_path)
+        future.add_done_callback(lambda f: self._finish(f.exception() is None, paths))
+        return f"{self.url_prefix}/{image_name}", f"{self.url_prefix}/{thumb_name}"
+
+    def discard(self, urls):
+        """
+        Marks the files behind `urls` (of a deleted report) as unwanted. Files
+        still queued are not written, or removed right after their write;
+        files already written are left to the caller to delete.
+        """
+        with self._lock:
+            for url in urls:
+                path = self._path_of(url)
+                if path in self._scheduled:
+                    self._discarded.add(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending, "written": self._written,
+                    "failed": self._failed, "rejected": self._rejected}
+
+    def shutdown(self):
+        """Waits for every scheduled write to finish"""
+        self._executor.shutdown(wait=True)
+
+    def _persist(self, data, image_path, thumb_path):
+        try:
+            if data is not None and not self._is_discarded(image_path):
+                self._write_atomic(image_path, data)
+            if self._is_discarded(thumb_path):
+                return
+            image = decode_image(data if data is not None else image_path,
+                                 min_size=(self.thumb_size, self.thumb_size))
+            image.thumbnail((self.thumb_size, self.thumb_size), Image.BILINEAR)
+            fd, tmp_path = tempfile.mkstemp(dir=self.media_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="JPEG", quality=80)
+            os.replace(tmp_path, thumb_path)
+            self._remove_if_discarded(thumb_path)
+        except Exception as e:
+            print(f"Failed to persist report image {image_path}: {e}")
+            raise
+
+    def _write_atomic(self, path, source):
+        fd, tmp_path = tempfile.mkstemp(dir=self.media_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(source, bytes):
+                    f.write(source)
+                else:
+                    source.seek(0)
+                    shutil.copyfileobj(source, f)
+            os.replace(tmp_path, path)
+            self._remove_if_discarded(path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _path_of(self, url):
+        return os.path.join(self.media_dir, os.path.basename(url))
+
+    def _is_discarded(self, path):
+        with self._lock:
+            return path in self._discarded
+
+    def _remove_if_discarded(self, path):
+        # Under the lock, so a concurrent discard() either sees the file as
+        # still scheduled or finds it already on disk for the caller to delete
+        with self._lock:
+            if path in self._discarded and os.path.exists(path):
+                os.remove(path)
+
+    def _finish(self, ok, paths):
+        with self._lock:
+            self._scheduled.difference_update(paths)
+            self._discarded.difference_update(paths)
+            self._pending -= 1
+            if ok:
+                self._written += 1
+            else:
+                self._failed += 1
@@ -0,0 +1,405 @@
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+# Statements are kept as constants so each connection's statement cache
+# (sqlite3 `cached_statements`) compiles them once and reuses the plan.
+INSERT_REPORT_SQL = "INSERT INTO reports (lat, lng, score, category, status, image_path, thumb_path, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+# The R*Tree narrows the search to the bounding box in O(log n); the exact
+# ABS() filter on the joined rows keeps the original strict-distance semantics
+# (R*Tree coordinates are stored as rounded-outward 32-bit floats).
+COUNT_NEARBY_RTREE_SQL = '''SELECT COUNT(*) FROM reports_rtree t
+                            JOIN reports r ON r.id = t.id
+                            WHERE t.max_lat >= ? AND t.min_lat <= ?
+                            AND t.max_lng >= ? AND t.min_lng <= ?
+                            AND ABS(r.lat - ?) < ? AND ABS(r.lng - ?) < ?
+                            AND r.status != 'Safe' '''
+# Fallback for SQLite builds without the R*Tree module: a range scan on the
+# (lat, lng) B-tree index.
+COUNT_NEARBY_BTREE_SQL = '''SELECT COUNT(*) FROM reports
+                            WHERE lat > ? AND lat < ?
+                            AND ABS(lat - ?) < ? AND ABS(lng - ?) < ?
+                            AND status != 'Safe' '''
+# Free-text search of the dashboard; LIKE is case-insensitive for ASCII
+SEARCH_REPORTS_SQL = '''(CAST(id AS TEXT) LIKE ? ESCAPE '\\' OR CAST(lat AS TEXT) LIKE ? ESCAPE '\\'
+                         OR CAST(lng AS TEXT) LIKE ? ESCAPE '\\' OR category LIKE ? ESCAPE '\\')'''
+REPORT_COLUMNS = ("id", "lat", "lng", "score", "category", "status", "image_path", "thumb_path", "timestamp")
+SELECT_IMAGE_PATHS_SQL = "SELECT image_path, thumb_path FROM reports WHERE id = ?"
+DELETE_REPORT_SQL = "DELETE FROM reports WHERE id = ?"
+LATEST_CHANGE_SQL = "SELECT COALESCE(MAX(seq), 0) FROM report_events"
+OLDEST_CHANGE_SQL = "SELECT MIN(seq) FROM report_events"
+CHANGES_SINCE_SQL = "SELECT seq, report_id, op FROM report_events WHERE seq > ? ORDER BY seq LIMIT ?"
+PRUNE_CHANGES_SQL = "DELETE FROM report_events WHERE seq <= (SELECT MAX(seq) FROM report_events) - ?"
+
+
+class ReportStore:
+    """Data-access layer for the `reports` SQLite table.
+
+    All writes go through a single writer thread that owns one connection,
+    so concurrent inserts queue up in-process instead of contending for the
+    SQLite file lock. Reads run on a small pool of threads, each with its
+    own connection. The database is switched to WAL journaling so readers
+    never block the writer and vice versa. Every public coroutine executes
+    its SQL off the event loop.
+    """
+
+    def __init__(self, db_path: str, readers: Optional[int] = None,
+                 change_retention: Optional[int] = None):
+        if readers is None:
+            readers = int(os.getenv("DB_READERS", 4))
+        if change_retention is None:
+            change_retention = int(os.getenv("REPORT_CHANGE_RETENTION", 100000))
+        self.db_path = db_path
+        self.change_retention = change_retention
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="db-reader")
+        self._local = threading.local()
+        self.spatial_index = None
+
+    def init_schema(self):
+        """Creates or migrates the reports table and enables WAL journaling"""
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            cursor = conn.cursor()
+            # Check if category column exists, add it if not
+            cursor.execute("PRAGMA table_info(reports)")
+            columns = [col[1] for col in cursor.fetchall()]
+
+            if 'category' not in columns:
+                cursor.execute('''CREATE TABLE IF NOT EXISTS reports_new
+                                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  lat REAL, lng REAL, score REAL,
+                                  category TEXT, status TEXT, image_path TEXT, timestamp DATETIME)''')
+                # If old table exists, migrate data
+                if 'lat' in columns:
+                    cursor.execute("INSERT INTO reports_new (lat, lng, score, status, timestamp) SELECT lat, lng, score, status, timestamp FROM reports")
+                    cursor.execute("DROP TABLE reports")
+                cursor.execute("ALTER TABLE reports_new RENAME TO reports")
+                # Set default values for old data
+                cursor.execute("UPDATE reports SET category = 'landfill' WHERE category IS NULL")
+
+            # Check for image_path specifically if category already existed
+            if 'image_path' not in columns:
+                try:
+                    cursor.execute("ALTER TABLE reports ADD COLUMN image_path TEXT")
+                except sqlite3.OperationalError:
+                    pass # Column already exists
+
+            cursor.execute('''CREATE TABLE IF NOT EXISTS reports
+                             (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                              lat REAL, lng REAL, score REAL,
+                              category TEXT, status TEXT, image_path TEXT, timestamp DATETIME)''')
+            # Dashboard thumbnail, added after image_path
+            cursor.execute("PRAGMA table_info(reports)")
+            if 'thumb_path' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE reports ADD COLUMN thumb_path TEXT")
+            self.spatial_index = self._init_spatial_index(cursor)
+            # Listing is ordered by (timestamp, id); the filter indexes end in
+            # timestamp so a filtered page is still an index range scan.
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_category_timestamp ON reports(category, timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_status_timestamp ON reports(status, timestamp)")
+            self._init_change_log(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_spatial_index(self, cursor):
+        """Indexes report coordinates for the proximity query. Uses an R*Tree
+        kept in sync by triggers, or a (lat, lng) B-tree index when SQLite
+        was built without R*Tree support."""
+        try:
+            cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS reports_rtree
+                              USING rtree(id, min_lat, max_lat, min_lng, max_lng)''')
+        except sqlite3.OperationalError:
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_reports_lat_lng ON reports(lat, lng)")
+            return "btree"
+
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS reports_rtree_insert AFTER INSERT ON reports
+                          WHEN NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL
+                          BEGIN
+                              INSERT INTO reports_rtree VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+                          END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS reports_rtree_update AFTER UPDATE OF lat, lng ON reports
+                          BEGIN
+                              DELETE FROM reports_rtree WHERE id = OLD.id;
+                              INSERT INTO reports_rtree SELECT NEW.id, NEW.lat, NEW.lat, NEW.lng, NEW.lng
+                                  WHERE NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL;
+                          END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS reports_rtree_delete AFTER DELETE ON reports
+                          BEGIN
+                              DELETE FROM reports_rtree WHERE id = OLD.id;
+                          END''')
+        # Backfill rows written before the index existed
+        cursor.execute('''INSERT INTO reports_rtree
+                          SELECT id, lat, lat, lng, lng FROM reports
+                          WHERE lat IS NOT NULL AND lng IS NOT NULL
+                          AND id NOT IN (SELECT id FROM reports_rtree)''')
+        return "rtree"
+
+    def _init_change_log(self, cursor):
+        """Journals every insert and delete on reports into report_events,
+        whose sequence number is the cursor of the dashboard change feed."""
+        cursor.execute('''CREATE TABLE IF NOT EXISTS report_events
+                          (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                           report_id INTEGER, op TEXT, timestamp DATETIME)''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS report_events_insert AFTER INSERT ON reports
+                          BEGIN
+                              INSERT INTO report_events (report_id, op, timestamp)
+                              VALUES (NEW.id, 'insert', CURRENT_TIMESTAMP);
+                          END''')
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS report_events_delete AFTER DELETE ON reports
+                          BEGIN
+                              INSERT INTO report_events (report_id, op, timestamp)
+                              VALUES (OLD.id, 'delete', CURRENT_TIMESTAMP);
+                          END''')
+
+    async def insert_report(self, lat, lng, score, category, status, image_path, thumb_path=None) -> int:
+        """Stores a report and returns its id"""
+        params = (float(lat), float(lng), float(score), category, status, image_path, thumb_path,
+                  format_timestamp(datetime.now()))
+        def insert(conn):
+            report_id = conn.execute(INSERT_REPORT_SQL, params).lastrowid
+            conn.execute(PRUNE_CHANGES_SQL, (self.change_retention,))
+            return report_id
+        return await self._write(insert)
+
+    async def count_nearby_incidents(self, lat, lng, radius=0.001) -> int:
+        """Counts non-safe reports within `radius` degrees of (lat, lng)"""
+        lat, lng = float(lat), float(lng)
+        if self.spatial_index == "rtree":
+            sql = COUNT_NEARBY_RTREE_SQL
+            params = (lat - radius, lat + radius, lng - radius, lng + radius,
+                      lat, radius, lng, radius)
+        else:
+            sql = COUNT_NEARBY_BTREE_SQL
+            params = (lat - radius, lat + radius, lat, radius, lng, radius)
+        return await self._read(lambda conn: conn.execute(sql, params).fetchone()[0])
+
+    async def list_reports(self, limit=100, cursor=None, category=None, status=None,
+                           min_score=None, max_score=None, bbox=None,
+                           since=None, until=None, search=None, fields=None) -> tuple:
+        """Returns one page of reports, newest first, and the cursor of the
+        next page (None on the last page).
+
+        Pagination is keyset-based on (timestamp, id), so every page costs
+        the same however deep it is. Scores are filtered as min_score <
+        score <= max_score. `bbox` is (min_lat, min_lng, max_lat, max_lng);
+        `since`/`until` are ISO 8601 dates or timestamps; `search` matches a
+        substring of the id, coordinates or category; `fields` restricts
+        the returned columns.
+        """
+        fields = list(fields or REPORT_COLUMNS)
+        unknown = [f for f in fields if f not in REPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown report fields: {', '.join(unknown)}")
+        # id and timestamp are needed to build the next cursor
+        selected = fields + [f for f in ("id", "timestamp") if f not in fields]
+
+        where, params = self._filters(category, status, min_score, max_score,
+                                      bbox, since, until, search)
+        if cursor is not None:
+            last_timestamp, last_id = decode_cursor(cursor)
+            where.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([last_timestamp, last_timestamp, last_id])
+
+        sql = f"SELECT {', '.join(selected)} FROM reports"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(int(limit) + 1)
+
+        def query(conn):
+            rows = conn.execute(sql, params).fetchall()
+            reports = [dict(zip(selected, row)) for row in rows[:limit]]
+            next_cursor = None
+            if len(rows) > limit:
+                last = reports[-1]
+                next_cursor = encode_cursor(last["timestamp"], last["id"])
+            for report in reports:
+                for f in selected[len(fields):]:
+                    del report[f]
+            return reports, next_cursor
+        return await self._read(query)
+
+    async def report_stats(self, critical_score, category=None, status=None,
+                           min_score=None, max_score=None, bbox=None,
+                           since=None, until=None, search=None) -> dict:
+        """Counts the reports matching the `list_reports` filters: in total,
+        per category and with a score above `critical_score`. Counted in
+        SQL, so the totals do not depend on how many pages were loaded.
+        """
+        where, params = self._filters(category, status, min_score, max_score,
+                                      bbox, since, until, search)
+        sql = "SELECT category, COUNT(*), COALESCE(SUM(score > ?), 0) FROM reports"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY category"
+        params.insert(0, float(critical_score))
+
+        def query(conn):
+            rows = conn.execute(sql, params).fetchall()
+            return {"total": sum(count for _, count, _ in rows),
+                    "categories": {cat: count for cat, count, _ in rows},
+                    "critical": sum(critical for _, _, critical in rows)}
+        return await self._read(query)
+
+    def _filters(self, category, status, min_score, max_score, bbox, since, until, search):
+        """WHERE conditions and their parameters shared by listing and counting"""
+        where, params = [], []
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        # Score ranges are half-open, min_score < score <= max_score, so
+        # adjacent ranges (and score > critical_score) never share a report
+        if min_score is not None:
+            where.append("score > ?")
+            params.append(float(min_score))
+        if max_score is not None:
+            where.append("score <= ?")
+            params.append(float(max_score))
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(parse_timestamp(since, "since"))
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(parse_timestamp(until, "until"))
+        if bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox)
+            if self.spatial_index == "rtree":
+                where.append('''id IN (SELECT id FROM reports_rtree
+                                        WHERE max_lat >= ? AND min_lat <= ? AND max_lng >= ? AND min_lng <= ?)''')
+                params.extend([min_lat, max_lat, min_lng, max_lng])
+            where.append("lat BETWEEN ? AND ? AND lng BETWEEN ? AND ?")
+            params.extend([min_lat, max_lat, min_lng, max_lng])
+        if search:
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append(SEARCH_REPORTS_SQL)
+            params.extend([pattern] * 4)
+        return where, params
+
+    async def delete_report(self, report_id: int) -> list:
+        """Deletes a report and returns the image paths it referenced"""
+        def delete(conn):
+            row = conn.execute(SELECT_IMAGE_PATHS_SQL, (report_id,)).fetchone()
+            conn.execute(DELETE_REPORT_SQL, (report_id,))
+            return [path for path in row if path] if row else []
+        return await self._write(delete)
+
+    async def latest_change(self) -> int:
+        """Sequence number of the most recent change"""
+        return await self._read(lambda conn: conn.execute(LATEST_CHANGE_SQL).fetchone()[0])
+
+    async def changes_since(self, since: int, limit: int = 500) -> dict:
+        """Reports inserted and ids deleted after change `since`.
+
+        `cursor` is the sequence number to pass as `since` next time. When
+        the requested position has already been pruned from the change log,
+        `reset` is True and the caller should reload the report list.
+        """
+        def query(conn):
+            oldest = conn.execute(OLDEST_CHANGE_SQL).fetchone()[0]
+            if oldest is not None and since < oldest - 1:
+                latest = conn.execute(LATEST_CHANGE_SQL).fetchone()[0]
+                return {"reset": True, "added": [], "removed": [], "cursor": latest}
+
+            events = conn.execute(CHANGES_SINCE_SQL, (since, limit)).fetchall()
+            inserted, removed = [], []
+            for _, report_id, op in events:
+                if op == "insert":
+                    inserted.append(report_id)
+                elif report_id in inserted:
+                    inserted.remove(report_id)
+                else:
+                    removed.append(report_id)
+
+            added = []
+            if inserted:
+                placeholders = ", ".join("?" * len(inserted))
+                cursor = conn.execute(
+                    f"SELECT {', '.join(REPORT_COLUMNS)} FROM reports WHERE id IN ({placeholders}) "
+                    "ORDER BY timestamp DESC, id DESC", inserted)
+                added = [dict(zip(REPORT_COLUMNS, row)) for row in cursor.fetchall()]
+            return {
+                "reset": False,
+                "added": added,
+                "removed": removed,
+                "cursor": events[-1][0] if events else since,
+            }
+        return await self._read(query)
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    async def _write(self, fn):
+        def run():
+            conn = self._connection()
+            try:
+                result = fn(conn)
+                conn.commit()
+                return result
+            except BaseException:
+                conn.rollback()
+                raise
+        return await asyncio.get_running_loop().run_in_executor(self._writer, run)
+
+    async def _read(self, fn):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._readers, lambda: fn(self._connection()))
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+
+def format_timestamp(moment: datetime) -> str:
+    """The stored timestamp layout, `YYYY-MM-DD HH:MM:SS.ffffff` in local
+    time, which sorts chronologically as a string"""
+    return moment.isoformat(" ", "microseconds")
+
+
+def parse_timestamp(value: str, name: str) -> str:
+    """Re-formats an ISO 8601 date or timestamp filter to the stored layout,
+    so it compares correctly against the stored strings. Timestamps with an
+    offset are converted to local time. Raises ValueError."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or timestamp, not {value!r}") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return format_timestamp(moment)
+
+
+def encode_cursor(timestamp, report_id) -> str:
+    raw = json.dumps([timestamp, report_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, report_id = json.loads(base64.urlsafe_b64decode(padded))
+        return timestamp, int(report_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid pagination cursor") from e
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResultCache:
+    """LRU + TTL cache of analysis results keyed by upload content hash.
+
+    The in-memory tier holds the most recently used results. When a
+    ``disk_path`` is given, results are also written to a small SQLite table
+    so repeat submissions survive restarts and are shared between workers.
+    Values must be JSON-serializable. All methods are thread-safe.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 disk_path: Optional[str] = None, max_disk_entries: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("RESULT_CACHE_SIZE", 256))
+        if ttl is None:
+            ttl = float(os.getenv("RESULT_CACHE_TTL", 3600))
+        if disk_path is None:
+            disk_path = os.getenv("RESULT_CACHE_DB") or None
+        if max_disk_entries is None:
+            max_disk_entries = int(os.getenv("RESULT_CACHE_DISK_SIZE", 10000))
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute('''CREATE TABLE IF NOT EXISTS results
+                                  (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)''')
+            self._disk.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed)")
+            self._disk.commit()
+            self._disk_path = disk_path
+            # A SQLite connection must not be used across fork(); pre-forked
+            # workers (serve.py) open their own
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._reopen_disk)
+
+    @staticmethod
+    def make_key(*payloads, **params) -> str:
+        """Hash of the raw upload bytes plus the analysis parameters"""
+        digest = hashlib.sha256()
+        for payload in payloads:
+            digest.update(len(payload).to_bytes(8, "little"))
+            digest.update(payload)
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._disk.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                    self._disk.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self._disk_hits += 1
+                    return value
+
+            self._misses += 1
+            return None
+
+    def put(self, key: str, value):
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._disk is not None:
+                self._disk.execute("INSERT OR REPLACE INTO results (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                                   (key, json.dumps(value), expires, now))
+                self._disk.execute("DELETE FROM results WHERE expires <= ?", (now,))
+                self._disk.execute('''DELETE FROM results WHERE key IN
+                                      (SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)''',
+                                   (self.max_disk_entries,))
+                self._disk.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM results")
+                self._disk.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_tier": self._disk is not None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _reopen_disk(self):
+        self._lock = threading.Lock()
+        self._disk = sqlite3.connect(self._disk_path, check_same_thread=False)
+
+    def _remember(self, key, expires, value):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
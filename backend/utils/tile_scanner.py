@@ -0,0 +1,137 @@
+import os
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+from utils.ingest import MAX_UPLOAD_BYTES, load_rgb_array, open_image, to_rgb
+from utils.landfill_processor import (SAT_MIDPOINT, compute_chaos_index, fuse_sat_score,
+                                      calibrate_score, classify_landfill_score)
+
+# Resolution the aerial model and the chaos index are calibrated for
+MODEL_INPUT_SIZE = 800
+TILE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp")
+
+
+def iter_tiles(source, tile_size=MODEL_INPUT_SIZE):
+    """
+    Yields (tile_info, tile_np) pairs from a mosaic image (PNG, JPEG, TIFF or
+    GeoTIFF) or from a zip archive of individual tiles.
+    `source` is a path or a seekable binary file object.
+
+    Every tile is handed out at MODEL_INPUT_SIZE x MODEL_INPUT_SIZE, the same
+    resolution `/predict` scores uploads at. Mosaics go through the upload
+    checks (format, INGEST_MAX_PIXELS) and are decoded once; larger areas
+    should be sent as a zip of tiles. A zip member that cannot be read is
+    yielded with `tile_np` None and an "error" in its tile_info.
+    """
+    is_zip = zipfile.is_zipfile(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if is_zip:
+        yield from _iter_zip_tiles(source)
+    else:
+        yield from _iter_mosaic_tiles(source, tile_size)
+
+
+def _iter_zip_tiles(source):
+    with zipfile.ZipFile(source) as archive:
+        names = sorted(n for n in archive.namelist()
+                       if n.lower().endswith(TILE_EXTENSIONS) and not n.endswith("/"))
+        for idx, name in enumerate(names):
+            info = {"tile": idx, "name": name}
+            try:
+                if archive.getinfo(name).file_size > MAX_UPLOAD_BYTES:
+                    raise ValueError(f"Tile is larger than {MAX_UPLOAD_BYTES} bytes")
+                with archive.open(name) as member:
+                    tile_np = load_rgb_array(member.read(), (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+            except (ValueError, OSError, zipfile.BadZipFile) as e:
+                # UnsupportedImage and ImageTooLarge are ValueErrors too
+                yield {**info, "error": str(e)}, None
+                continue
+            yield info, tile_np
+
+
+def _iter_mosaic_tiles(source, tile_size):
+    with open_image(source) as mosaic:
+        mosaic_np = np.asarray(to_rgb(mosaic))
+
+    height, width = mosaic_np.shape[:2]
+    idx = 0
+    for row, y in enumerate(range(0, height, tile_size)):
+        for col, x in enumerate(range(0, width, tile_size)):
+            tile = mosaic_np[y:y + tile_size, x:x + tile_size]
+            info = {
+                "tile": idx, "row": row, "col": col, "x": x, "y": y,
+                "width": tile.shape[1], "height": tile.shape[0],
+            }
+            idx += 1
+            yield info, _to_model_input(tile)
+
+
+def _to_model_input(tile):
+    if isinstance(tile, np.ndarray):
+        if tile.shape[:2] == (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE):
+            return np.ascontiguousarray(tile)
+        tile = Image.fromarray(tile)
+    return np.array(tile.resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), Image.BILINEAR))
+
+
+class TileScanner:
+    """Scores tiles in batches with the aerial pipeline used by `/predict`.
+
+    A batch takes one forward per TTA scale only with models that return a
+    CAM per sample; pair-fusing models still take one forward per tile.
+    """
+
+    def __init__(self, engine, batch_size=None):
+        self.engine = engine
+        self.batch_size = batch_size or int(os.getenv("SCAN_BATCH_SIZE", 8))
+
+    def scan(self, tiles, batch_size=None):
+        """
+        Consumes (tile_info, tile_np) pairs and yields, per batch, the list of
+        per-tile score records.
+        """
+        batch_size = max(1, batch_size or self.batch_size)
+        batch = []
+        for tile in tiles:
+            batch.append(tile)
+            if len(batch) == batch_size:
+                yield self.score_batch(batch)
+                batch = []
+        if batch:
+            yield self.score_batch(batch)
+
+    def score_batch(self, batch):
+        tiles_np = [tile_np for _, tile_np in batch if tile_np is not None]
+        if self.engine and tiles_np:
+            wrappers = iter(self.engine.execute_cams_pred_batch(tiles_np))
+        else:
+            wrappers = None
+
+        records = []
+        for info, tile_np in batch:
+            if tile_np is None:
+                # Unreadable tile: reported as-is, the scan goes on
+                records.append(info)
+                continue
+            iw = next(wrappers) if wrappers is not None else None
+            chaos_idx, _ = compute_chaos_index(tile_np)
+            if iw is not None:
+                resnet_score = float(iw.classification_scores[0])
+                score = fuse_sat_score(resnet_score, chaos_idx)
+            else:
+                resnet_score = None
+                score = chaos_idx
+            final_score = calibrate_score(score, SAT_MIDPOINT)
+            status, status_type = classify_landfill_score(final_score)
+            records.append({
+                **info,
+                "prediction": status.upper(),
+                "status_type": status_type,
+                "confidence": round(final_score * 100, 2),
+                "chaos_index": round(chaos_idx, 4),
+                "resnet_score": None if resnet_score is None else round(resnet_score, 4),
+            })
+        return records
@@ -1,5 +1,5 @@
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
     Leaf, Bell, MapPin, Calendar, User,
     Filter, Search, CheckCircle, Clock,
@@ -9,8 +9,27 @@ import {
 } from 'lucide-react';
 import axios from 'axios';
 
+const PAGE_SIZE = 100;
+const SEARCH_DEBOUNCE_MS = 300;
+// Score range of each risk level, sent to the API as min_score < score <= max_score
+// (the same bounds as severityOf and the server's critical count)
+const SEVERITY_SCORES = {
+    critical: { min_score: 0.4 },
+    high: { min_score: 0.2, max_score: 0.4 },
+    medium: { min_score: 0.05, max_score: 0.2 },
+    low: { max_score: 0.05 },
+};
+
+const severityOf = (score) => {
+    if (score > 0.4) return 'critical';
+    if (score > 0.2) return 'high';
+    if (score > 0.05) return 'medium';
+    return 'low';
+};
+
 const GovDashboard = () => {
     const [reports, setReports] = useState([]);
+    const [stats, setStats] = useState({ total: 0, categories: {}, critical: 0 });
     const [loading, setLoading] = useState(true);
     const [filterCategory, setFilterCategory] = useState('all');
     const [filterStatus, setFilterStatus] = useState('all');
@@ -18,30 +37,102 @@ const GovDashboard = () => {
     const [searchQuery, setSearchQuery] = useState('');
     const [selectedReport, setSelectedReport] = useState(null);
     const [dispatched, setDispatched] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [changeCursor, setChangeCursor] = useState(null);
+    const requestSeq = useRef(0);
+    const latest = useRef(null);
 
+    // Filtering happens server-side, so every page and the totals cover all matching reports
+    const filterParams = () => {
+        const params = {};
+        if (filterCategory !== 'all') params.category = filterCategory;
+        if (filterStatus !== 'all') params.status = filterStatus;
+        if (filterSeverity !== 'all') Object.assign(params, SEVERITY_SCORES[filterSeverity]);
+        if (searchQuery.trim()) params.search = searchQuery.trim();
+        return params;
+    };
+
+    // Same filters, for reports pushed by the change feed
+    const matchesFilters = (report) => {
+        const query = searchQuery.trim().toLowerCase();
+        return (filterCategory === 'all' || report.category === filterCategory) &&
+            (filterStatus === 'all' || report.status === filterStatus) &&
+            (filterSeverity === 'all' || severityOf(report.score) === filterSeverity) &&
+            (!query ||
+                report.id.toString().includes(query) ||
+                (report.lat != null && report.lat.toString().includes(query)) ||
+                (report.lng != null && report.lng.toString().includes(query)) ||
+                (report.category || '').toLowerCase().includes(query));
+    };
+
+    useEffect(() => {
+        const timer = setTimeout(() => fetchReports(), searchQuery ? SEARCH_DEBOUNCE_MS : 0);
+        return () => clearTimeout(timer);
+    }, [filterCategory, filterStatus, filterSeverity, searchQuery]);
+
+    // The change feed handler outlives renders; it reads the current filters through this ref
+    latest.current = { fetchReports, fetchStats, matchesFilters };
+
+    // Live change feed: merge new reports and drop deleted ones instead of re-polling the list
     useEffect(() => {
-        fetchReports();
-    }, []);
+        if (changeCursor === null) return;
+        const source = new EventSource(`/api/reports/stream?since=${changeCursor}`);
+        source.addEventListener('changes', (event) => {
+            const changes = JSON.parse(event.data);
+            if (changes.reset) {
+                latest.current.fetchReports();
+                return;
+            }
+            const { matchesFilters } = latest.current;
+            setReports(prev => {
+                const removed = new Set(changes.removed);
+                const known = new Set(prev.map(r => r.id));
+                const added = changes.added.filter(r => !known.has(r.id) && matchesFilters(r));
+                return [...added, ...prev.filter(r => !removed.has(r.id))];
+            });
+            latest.current.fetchStats();
+        });
+        return () => source.close();
+    }, [changeCursor]);
 
-    const fetchReports = async () => {
+    async function fetchStats() {
+        try {
+            const response = await axios.get('/api/reports/stats', { params: filterParams() });
+            if (response.data && response.data.success) setStats(response.data);
+        } catch (error) {
+            console.error('Error fetching report stats:', error);
+        }
+    }
+
+    // Reports are paged server-side; `cursor` continues after the last loaded page
+    async function fetchReports(cursor = null) {
+        // Responses of an older filter that arrive late are dropped
+        const seq = ++requestSeq.current;
         setLoading(true);
         try {
-            const response = await axios.get('/api/reports');
+            const params = { limit: PAGE_SIZE, ...filterParams() };
+            if (cursor) params.cursor = cursor;
+            if (!cursor) fetchStats();
+            const response = await axios.get('/api/reports', { params });
+            if (seq !== requestSeq.current) return;
             if (response.data && response.data.reports) {
-                setReports(response.data.reports);
+                // Functional update: the change feed may have merged reports while this page loaded
+                setReports(prev => cursor ? [...prev, ...response.data.reports] : response.data.reports);
+                setNextCursor(response.data.next_cursor || null);
+                if (!cursor) setChangeCursor(response.data.change_cursor);
             }
         } catch (error) {
             console.error('Error fetching reports:', error);
         } finally {
-            setLoading(false);
+            if (seq === requestSeq.current) setLoading(false);
         }
-    };
+    }
 
     const deleteReport = async (id) => {
         if (!window.confirm('Confirm permanent removal of this log from regional surveillance records?')) return;
         try {
             await axios.delete(`/api/reports/${id}`);
-            setReports(reports.filter(r => r.id !== id));
+            setReports(prev => prev.filter(r => r.id !== id));
             if (selectedReport?.id === id) setSelectedReport(null);
         } catch (error) {
             console.error('Error deleting report:', error);
@@ -54,33 +145,12 @@ const GovDashboard = () => {
         }
     };
 
-    const filteredReports = reports.filter(report => {
-        const matchesCategory = filterCategory === 'all' || report.category === filterCategory;
-        const matchesStatus = filterStatus === 'all' || report.status.toLowerCase() === filterStatus.toLowerCase();
-
-        let reportSeverity = 'Normal';
-        if (report.score > 0.4) reportSeverity = 'critical';
-        else if (report.score > 0.2) reportSeverity = 'high';
-        else if (report.score > 0.05) reportSeverity = 'medium';
-        else reportSeverity = 'low';
-
-        const matchesSeverity = filterSeverity === 'all' || reportSeverity === filterSeverity;
-
-        const matchesSearch =
-            report.id.toString().includes(searchQuery) ||
-            (report.lat && report.lat.toString().includes(searchQuery)) ||
-            (report.lng && report.lng.toString().includes(searchQuery)) ||
-            (report.category && report.category.toLowerCase().includes(searchQuery.toLowerCase()));
-
-        return matchesCategory && matchesStatus && matchesSearch && matchesSeverity;
-    });
-
-    const stats = {
-        total: reports.length,
-        landfill: reports.filter(r => r.category === 'landfill').length,
-        deforestation: reports.filter(r => r.category === 'deforestation').length,
-        critical: reports.filter(r => r.score > 0.4).length,
-        pending: reports.length - dispatched.length
+    const summary = {
+        total: stats.total,
+        landfill: stats.categories.landfill || 0,
+        deforestation: stats.categories.deforestation || 0,
+        critical: stats.critical,
+        pending: Math.max(0, stats.total - dispatched.length)
     };
 
     const getStatusColor = (status, score) => {
@@ -105,7 +175,7 @@ const GovDashboard = () => {
                     </div>
                     <div className="flex gap-4">
                         <button
-                            onClick={fetchReports}
+                            onClick={() => fetchReports()}
                             className="bg-white/5 hover:bg-white/10 border border-white/10 px-6 py-3 rounded-2xl flex items-center gap-3 transition-all group active:scale-95"
                         >
                             <RefreshCw className={`w-4 h-4 ${loading ? 'animate-spin text-primary' : 'text-muted group-hover:text-primary transition-colors'}`} />
@@ -117,10 +187,10 @@ const GovDashboard = () => {
                 {/* Quick Stats Grid */}
                 <div className="grid grid-cols-2 md:grid-cols-5 gap-4 mb-12">
                     {[
-                        { label: 'Signal Logs', value: stats.total, icon: Bell, color: 'text-white' },
-                        { label: 'Pending Response', value: stats.pending, icon: Clock, color: 'text-warning' },
-                        { label: 'Deforestation', value: stats.deforestation, icon: Leaf, color: 'text-success' },
-                        { label: 'Critical Zones', value: stats.critical, icon: AlertTriangle, color: 'text-danger' },
+                        { label: 'Signal Logs', value: summary.total, icon: Bell, color: 'text-white' },
+                        { label: 'Pending Response', value: summary.pending, icon: Clock, color: 'text-warning' },
+                        { label: 'Deforestation', value: summary.deforestation, icon: Leaf, color: 'text-success' },
+                        { label: 'Critical Zones', value: summary.critical, icon: AlertTriangle, color: 'text-danger' },
                         { label: 'Accuracy Rating', value: '98.4%', icon: Activity, color: 'text-primary' },
                     ].map((s, i) => (
                         <div key={i} className="glass-panel p-6 relative overflow-hidden group hover:border-primary/20 transition-all">
@@ -175,7 +245,7 @@ const GovDashboard = () => {
 
                         {/* Intelligence List */}
                         <div className="space-y-4">
-                            {filteredReports.map((report) => (
+                            {reports.map((report) => (
                                 <div
                                     key={report.id}
                                     onClick={() => setSelectedReport(report)}
@@ -185,7 +255,14 @@ const GovDashboard = () => {
                                         <div className="relative group/thumb">
                                             {report.image_path ? (
                                                 <img
-                                                    src={report.image_path}
+                                                    src={report.thumb_path || report.image_path}
+                                                    onError={(e) => {
+                                                        // Thumbnails are rendered just after the report is stored
+                                                        if (report.thumb_path && !e.currentTarget.dataset.fallback) {
+                                                            e.currentTarget.dataset.fallback = '1';
+                                                            e.currentTarget.src = report.image_path;
+                                                        }
+                                                    }}
                                                     alt="Evidence"
                                                     className="w-16 h-16 rounded-2xl object-cover border border-white/10 group-hover/thumb:border-primary/50 transition-all"
                                                 />
@@ -229,7 +306,17 @@ const GovDashboard = () => {
                                 </div>
                             ))}
 
-                            {filteredReports.length === 0 && !loading && (
+                            {nextCursor && (
+                                <button
+                                    onClick={() => fetchReports(nextCursor)}
+                                    disabled={loading}
+                                    className="w-full bg-white/5 hover:bg-white/10 border border-white/10 py-4 rounded-2xl text-[10px] font-black uppercase tracking-widest transition-all disabled:opacity-40"
+                                >
+                                    {loading ? 'Syncing...' : 'Load Older Signals'}
+                                </button>
+                            )}
+
+                            {reports.length === 0 && !loading && (
                                 <div className="glass-panel p-24 text-center">
                                     <div className="w-20 h-20 bg-white/5 rounded-full flex items-center justify-center mx-auto mb-6">
                                         <Search className="w-10 h-10 text-white/10" />